@@ -0,0 +1,198 @@
+#!/usr/bin/python
+## Benchmarks for the hot paths of python_ltspice_tools: reading netlists, finding and changing parameters,
+## reading .raw files and looking up node values. Builds synthetic netlists and ascii/binary .raw files of a given
+## size and swaps LTspice for a stub (this script run with -run) that copies canned outputs into place.
+## Prints (or writes with --output) the timings, plus the instrumentation's stage totals and counters, as json so
+## they can be compared between versions.
+## Example: python benchmark_python_ltspice_tools.py --nodes 50 --points 20000 --steps 4 --output bench.json
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","src"))
+import numpy
+from python_ltspice_tools import *
+from python_ltspice_instrument import instrumentation
+from python_ltspice_analysis import analyze_traces
+
+#----------------------------------------Write Netlist File----------------------------------------#{{{1
+def write_netlist_file(filename,number_of_parameters,number_of_elements):
+    """Writes a synthetic transient netlist with a chain of resistors and a .param line per 10 parameters"""
+    file = open(filename,"w")
+    file.write("* synthetic benchmark netlist\n")
+    file.write("V1 n0 0 PULSE(0 1 0 1n 1n 5u 10u)\n")
+    for element_number in range(number_of_elements):
+        file.write("R{0} n{0} n{1} {{R{2}}}\n".format(element_number,element_number+1,
+                                                    element_number % max(number_of_parameters,1)))
+    for line_start in range(0,number_of_parameters,10):
+        line_parameters = ["R{}={}k".format(number,number+1)
+                           for number in range(line_start,min(line_start+10,number_of_parameters))]
+        file.write(".param "+" ".join(line_parameters)+"\n")
+    file.write(".tran 100u\n.backanno\n.end\n")
+    file.close()
+#----------------------------------------END Write Netlist File----------------------------------------#}}}
+
+#----------------------------------------Write Raw File----------------------------------------#{{{1
+def write_raw_file(filename,number_of_nodes,number_of_points,number_of_steps,binary=True):
+    """Writes a synthetic transient .raw file of time plus number_of_nodes voltages, number_of_points per step"""
+    time_values = numpy.tile(numpy.linspace(0,1e-4,number_of_points),number_of_steps)
+    traces = [numpy.sin(time_values*1e5+node_number) for node_number in range(number_of_nodes)]
+    flags = "real forward"
+    if number_of_steps > 1:
+        flags += " stepped"
+    header = "Title: * synthetic benchmark netlist\nDate: now\nPlotname: Transient Analysis\nFlags: {}\n".format(flags)
+    header += "No. Variables: {}\nNo. Points: {}\nOffset:   0.0\n".format(number_of_nodes+1,len(time_values))
+    header += "Command: benchmark stub\nVariables:\n\t0\ttime\ttime\n"
+    for node_number in range(number_of_nodes):
+        header += "\t{}\tV(n{})\tvoltage\n".format(node_number+1,node_number)
+
+    if binary == True:
+        header += "Binary:\n"
+        point_dtype = numpy.dtype({"names":["f{}".format(number) for number in range(number_of_nodes+1)],
+                                   "formats":["<f8"]+["<f4"]*number_of_nodes})
+        points = numpy.zeros(len(time_values),dtype=point_dtype)
+        points["f0"] = time_values
+        for node_number in range(number_of_nodes):
+            points["f{}".format(node_number+1)] = traces[node_number]
+        file = open(filename,"wb")
+        file.write(header.encode("utf-16-le"))
+        file.write(points.tobytes())
+        file.close()
+    else:
+        file = open(filename,"w")
+        file.write(header+"Values:\n")
+        for point_number in range(len(time_values)):
+            file.write("{}\t{:.15e}\n".format(point_number,time_values[point_number]))
+            for trace in traces:
+                file.write("\t{:.15e}\n".format(trace[point_number]))
+        file.close()
+#----------------------------------------END Write Raw File----------------------------------------#}}}
+
+#----------------------------------------Stub Simulator----------------------------------------#{{{1
+def stub_simulator(arguments):
+    """Stands in for scad3.exe: copies the canned .raw and .log files next to the netlist given after -run"""
+    netlist_filename = arguments[arguments.index("-run")+1]
+    canned_directory = os.environ["BENCHMARK_CANNED_DIRECTORY"]
+    shutil.copy(os.path.join(canned_directory,"canned.raw"),netlist_filename.replace(".net",".raw"))
+    shutil.copy(os.path.join(canned_directory,"canned.log"),netlist_filename.replace(".net",".log"))
+#----------------------------------------END Stub Simulator----------------------------------------#}}}
+
+#----------------------------------------Time Stage----------------------------------------#{{{1
+def time_stage(function,repeats):
+    """Runs the function repeats times and returns the best and mean wall times in seconds"""
+    times = []
+    for repeat in range(repeats):
+        start_time = time.perf_counter()
+        function()
+        times.append(time.perf_counter()-start_time)
+    return({"best":min(times),"mean":sum(times)/len(times),"repeats":repeats})
+#----------------------------------------END Time Stage----------------------------------------#}}}
+
+#----------------------------------------Run Benchmarks----------------------------------------#{{{1
+def run_benchmarks(configuration):
+    """Builds the synthetic files in a temporary LTspiceIV style directory and times each stage.
+        Returns a dictionary of the configuration, environment and stage timings"""
+    repeats = configuration["repeats"]
+    root_directory = tempfile.mkdtemp()
+    ltspice_directory = os.path.join(root_directory,".wine","drive_c","Program Files","LTC","LTspiceIV")
+    work_directory = os.path.join(ltspice_directory,"benchmark")
+    os.makedirs(work_directory)
+    netlist_filename = os.path.join(work_directory,"benchmark.net")
+    write_netlist_file(netlist_filename,configuration["parameters"],configuration["elements"])
+    ascii_raw_filename = os.path.join(work_directory,"ascii.raw")
+    binary_raw_filename = os.path.join(work_directory,"binary.raw")
+    write_raw_file(ascii_raw_filename,configuration["nodes"],configuration["points"],configuration["steps"],
+                   binary=False)
+    write_raw_file(binary_raw_filename,configuration["nodes"],configuration["points"],configuration["steps"])
+    shutil.copy(binary_raw_filename,os.path.join(work_directory,"canned.raw"))
+    log_file = open(os.path.join(work_directory,"canned.log"),"w")
+    log_file.write("Circuit: * synthetic benchmark netlist\n\nTotal elapsed time: 0.001 seconds.\n")
+    log_file.close()
+
+    results = {}
+    instrumentation.reset()
+    original_directory = os.getcwd()
+    os.chdir(work_directory)
+    try:
+        netlist = netlist_class(netlist_filename)
+        netlist_lines = netlist.lines
+        command = simulation_commands.make_command("transient")
+        change_dictionary = {"R0":"42k","R{}".format(configuration["parameters"]-1):"7k"}
+
+        results["read_file"] = time_stage(netlist.read_file,repeats)
+        results["parameter_check"] = time_stage(lambda: [parameter_check(line) for line in netlist_lines],repeats)
+        results["change_parameters"] = time_stage(lambda: netlist.change_parameters(change_dictionary),repeats)
+        template = netlist.compile_template()
+        results["template_make_netlist"] = time_stage(lambda: template.make_netlist(change_dictionary),repeats)
+        results["read_ascii_raw"] = time_stage(lambda: raw_values_class(ascii_raw_filename.replace(".raw",".net"),
+                                                                        None,[],command),repeats)
+        results["read_binary_raw"] = time_stage(lambda: raw_values_class(binary_raw_filename.replace(".raw",".net"),
+                                                                         None,[],command),repeats)
+
+        results["read_ascii_raw_one_node"] = time_stage(lambda: raw_values_class(
+            ascii_raw_filename.replace(".raw",".net"),None,[],command,nodes=["n0"]),repeats)
+        results["read_binary_raw_one_node"] = time_stage(lambda: raw_values_class(
+            binary_raw_filename.replace(".raw",".net"),None,[],command,nodes=["n0"]),repeats)
+
+        raw_values = raw_values_class(binary_raw_filename.replace(".raw",".net"),None,[],command)
+        first_step = raw_values.return_step(0)
+        query_node = first_step["n0"]
+        query_times = numpy.linspace(0,1e-4,configuration["queries"])
+        results["find_node_value_at_independet_value"] = time_stage(
+            lambda: [raw_values.find_node_value_at_independet_value(query_time,query_node,step=0)
+                     for query_time in query_times],repeats)
+        results["find_node_values_at_independent_values"] = time_stage(
+            lambda: raw_values.find_node_values_at_independent_values(query_times,query_node,step=0),
+            repeats)
+        #every node of the first step measured as one batch
+        step_traces = [first_step[node].values for node in first_step if node != "time"]
+        step_times = [first_step["time"].values]*len(step_traces)
+        results["analyze_traces"] = time_stage(lambda: analyze_traces(step_times,step_traces),repeats)
+
+        os.environ["BENCHMARK_CANNED_DIRECTORY"] = work_directory
+        simulator = simulator_class(ltspice_directory=ltspice_directory,wine=sys.executable,
+                                    executable=os.path.abspath(__file__))
+        results["run_netlist_stub"] = time_stage(lambda: netlist.run_netlist(raise_errors=True,simulator=simulator),
+                                                 repeats)
+    finally:
+        os.chdir(original_directory)
+        shutil.rmtree(root_directory)
+
+    try:
+        version = subprocess.check_output(["git","describe","--always","--dirty"],stderr=subprocess.DEVNULL,
+                                          cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError,subprocess.CalledProcessError):
+        version = "unknown"
+    return({"version":version,"python":platform.python_version(),"numpy":numpy.__version__,
+            "configuration":configuration,"results":results,"instrumentation":instrumentation.summary()})
+#----------------------------------------END Run Benchmarks----------------------------------------#}}}
+
+if __name__ == "__main__":
+    if "-run" in sys.argv:
+        stub_simulator(sys.argv)
+        sys.exit(0)
+    parser = argparse.ArgumentParser(description="Benchmark python_ltspice_tools parsing, rendering and queries")
+    parser.add_argument("--nodes",type=int,default=20,help="voltage nodes in the .raw files")
+    parser.add_argument("--points",type=int,default=10000,help="points per step in the .raw files")
+    parser.add_argument("--steps",type=int,default=1,help="steps in the .raw files")
+    parser.add_argument("--parameters",type=int,default=100,help="parameters in the netlist")
+    parser.add_argument("--elements",type=int,default=1000,help="resistor lines in the netlist")
+    parser.add_argument("--queries",type=int,default=1000,help="time points looked up per query stage")
+    parser.add_argument("--repeats",type=int,default=3,help="times each stage is run, the best is reported")
+    parser.add_argument("--output",default=None,help="json file to write the results to instead of printing")
+    arguments = parser.parse_args()
+    configuration = {"nodes":arguments.nodes,"points":arguments.points,"steps":arguments.steps,
+                     "parameters":arguments.parameters,"elements":arguments.elements,"queries":arguments.queries,
+                     "repeats":arguments.repeats}
+    benchmark_results = run_benchmarks(configuration)
+    if arguments.output != None:
+        file = open(arguments.output,"w")
+        json.dump(benchmark_results,file,indent=2)
+        file.close()
+    else:
+        print(json.dumps(benchmark_results,indent=2))
@@ -0,0 +1,286 @@
+#!/usr/bin/python
+# Python Code for analysing transient waveforms in batches. The traces of every run (and step) of a sweep are
+# resampled from LTspice's non-uniform time steps onto one uniform grid, giving a runs by samples array that the
+# measurements (rise and fall times, overshoot, spectra and THD) work on all at once. Results come back as a
+# numpy structured array with one row per run and step
+from python_ltspice_lazy import lazy_import
+
+numpy = lazy_import("numpy",globals())
+
+#the measurement columns of an analysis table, in order
+analysis_measures = ("initial_value","final_value","minimum","maximum","overshoot","rise_time","fall_time",
+                     "fundamental","fundamental_amplitude","thd")
+
+#bins on each side of a spectral peak counted as part of it (the main lobe of a Hann window)
+peak_half_width = 2
+
+#steps smaller than this fraction of a row's range are float noise (ie a periodic trace), not a step
+step_tolerance = 1e-9
+
+#----------------------------------------Resample Traces----------------------------------------#{{{1
+def resample_traces(independent_values_list,node_values_list,number_of_samples=1024,start=None,stop=None):
+    """Linearly interpolates the node values of every run, each on its own sorted independent values (ie LTspice's
+        time steps), onto one uniform grid of number_of_samples points from start to stop. These default to the
+        span every run covers. Returns (grid,samples) where samples is a runs by number_of_samples array. Grid
+        points outside a run's independent values give nan"""
+    independent_values_list = [numpy.asarray(values,dtype=float) for values in independent_values_list]
+    if start == None:
+        start = max([values[0] for values in independent_values_list])
+    if stop == None:
+        stop = min([values[-1] for values in independent_values_list])
+    grid = numpy.linspace(start,stop,number_of_samples)
+    samples = numpy.empty((len(independent_values_list),number_of_samples))
+    for run_number, (independent_values, node_values) in enumerate(zip(independent_values_list,node_values_list)):
+        samples[run_number] = numpy.interp(grid,independent_values,numpy.asarray(node_values,dtype=float),
+                                           left=numpy.nan,right=numpy.nan)
+    return((grid,samples))
+#----------------------------------------END Resample Traces----------------------------------------#}}}
+
+#----------------------------------------Edge Measurements----------------------------------------#{{{1
+def first_crossing_times(grid,samples,levels,direction="rising"):
+    """Returns the linearly interpolated grid value (ie time) where each row of samples first reaches its level,
+        going up for "rising" or down for "falling". Rows that start past their level give the first grid value,
+        rows that never reach it give nan"""
+    levels = numpy.asarray(levels,dtype=float)[:,None]
+    if direction == "rising":
+        reached = samples >= levels
+    elif direction == "falling":
+        reached = samples <= levels
+    else:
+        raise ValueError("Invalid direction for first_crossing_times: {}".format(direction))
+    first_indices = numpy.argmax(reached,axis=1)
+    rows = numpy.arange(len(samples))
+    previous_indices = numpy.maximum(first_indices-1,0)
+    before = samples[rows,previous_indices]
+    after = samples[rows,first_indices]
+    with numpy.errstate(invalid="ignore",divide="ignore"):
+        fractions = numpy.where(after != before,(levels[:,0]-before)/(after-before),0.0)
+    times = grid[previous_indices] + numpy.clip(fractions,0.0,1.0)*(grid[first_indices]-grid[previous_indices])
+    times[first_indices == 0] = grid[0]
+    times[~reached.any(axis=1)] = numpy.nan
+    return(times)
+
+def step_levels(samples):
+    """Returns the (initial,final) values of each row of samples: its first and last values"""
+    return((samples[:,0],samples[:,-1]))
+
+def step_sizes(samples):
+    """Returns the final minus initial value of each row of samples, with nan for rows whose step is within
+        step_tolerance of the row's range"""
+    initial_values, final_values = step_levels(samples)
+    steps = final_values - initial_values
+    ranges = numpy.max(samples,axis=1) - numpy.min(samples,axis=1)
+    with numpy.errstate(invalid="ignore"):
+        steps[~(numpy.abs(steps) > step_tolerance*ranges)] = numpy.nan
+    return(steps)
+
+def rise_times(grid,samples,low=0.1,high=0.9):
+    """Returns the time each row takes to go from low to high (fractions of the step from its initial to its final
+        value) on its first rise. Rows whose final value isn't above their initial value (see step_sizes) give nan"""
+    initial_values, final_values = step_levels(samples)
+    steps = step_sizes(samples)
+    times = (first_crossing_times(grid,samples,initial_values+high*steps,"rising") -
+             first_crossing_times(grid,samples,initial_values+low*steps,"rising"))
+    times[~(steps > 0)] = numpy.nan
+    return(times)
+
+def fall_times(grid,samples,low=0.1,high=0.9):
+    """Returns the time each row takes to go from high to low (fractions of the step from its final to its initial
+        value) on its first fall. Rows whose final value isn't below their initial value (see step_sizes) give nan"""
+    initial_values, final_values = step_levels(samples)
+    steps = -step_sizes(samples)
+    times = (first_crossing_times(grid,samples,final_values+low*steps,"falling") -
+             first_crossing_times(grid,samples,final_values+high*steps,"falling"))
+    times[~(steps > 0)] = numpy.nan
+    return(times)
+
+def overshoots(samples):
+    """Returns how far each row goes past its final value, in the direction of its step, as a fraction of the step
+        from its initial value. Rows that never pass their final value give 0, rows with no step (see step_sizes)
+        nan"""
+    initial_values, final_values = step_levels(samples)
+    steps = step_sizes(samples)
+    with numpy.errstate(invalid="ignore",divide="ignore"):
+        peaks = numpy.max((samples-final_values[:,None])*numpy.sign(steps)[:,None],axis=1)
+        results = numpy.maximum(peaks,0.0)/numpy.abs(steps)
+    return(results)
+#----------------------------------------END Edge Measurements----------------------------------------#}}}
+
+#----------------------------------------Spectra----------------------------------------#{{{1
+def spectrum_window(number_of_samples,window="hann"):
+    """Returns the "hann" or "rectangular" window of the given length"""
+    if window == "hann":
+        return(numpy.hanning(number_of_samples))
+    if window in ("rectangular",None):
+        return(numpy.ones(number_of_samples))
+    raise ValueError("Invalid window for spectra: {}".format(window))
+
+def spectra(grid,samples,window="hann"):
+    """Returns (frequencies,amplitudes): the one sided amplitude spectrum of every row of uniformly sampled values,
+        with the mean removed and the window applied. A sine of amplitude A on a bin gives a peak of A"""
+    window_values = spectrum_window(samples.shape[1],window)
+    transforms = numpy.fft.rfft((samples-samples.mean(axis=1,keepdims=True))*window_values,axis=1)
+    frequencies = numpy.fft.rfftfreq(samples.shape[1],grid[1]-grid[0])
+    return((frequencies,2*numpy.abs(transforms)/window_values.sum()))
+
+def harmonic_distortion(grid,samples,fundamental=None,harmonics=9,window="hann"):
+    """Returns (fundamentals,amplitudes,thd) for every row of uniformly sampled values: the fundamental frequency,
+        its amplitude and the total harmonic distortion (rms of harmonics 2 to harmonics+1 over the fundamental).
+        The fundamental is the largest non DC peak unless given, and its frequency is refined to a fraction of a
+        bin. Each peak's power is summed over the bins of its window's main lobe, so amplitudes don't depend on
+        where the tone falls between bins. Resample over a whole number of periods for the cleanest results"""
+    window_values = spectrum_window(samples.shape[1],window)
+    transforms = numpy.fft.rfft((samples-samples.mean(axis=1,keepdims=True))*window_values,axis=1)
+    powers = numpy.abs(transforms)**2
+    frequency_step = 1/(samples.shape[1]*(grid[1]-grid[0]))
+    number_of_bins = powers.shape[1]
+    if fundamental == None:
+        fundamental_bins = numpy.argmax(powers[:,1:],axis=1) + 1
+    else:
+        fundamental_bins = numpy.full(len(samples),int(round(fundamental/frequency_step)))
+
+    #power of each peak band, from a running sum along the bins
+    running_power = numpy.concatenate((numpy.zeros((len(samples),1)),numpy.cumsum(powers,axis=1)),axis=1)
+    harmonic_bins = fundamental_bins[:,None]*numpy.arange(1,harmonics+2)[None,:]
+    band_starts = numpy.clip(harmonic_bins-peak_half_width,0,number_of_bins)
+    band_stops = numpy.clip(harmonic_bins+peak_half_width+1,0,number_of_bins)
+    band_powers = (numpy.take_along_axis(running_power,band_stops,axis=1) -
+                   numpy.take_along_axis(running_power,band_starts,axis=1))
+    band_powers[harmonic_bins >= number_of_bins] = 0.0
+
+    #the fundamental frequency is the power weighted mean bin of its band, finer than the bin spacing
+    rows = numpy.arange(len(samples))
+    weighted_power = numpy.cumsum(powers*numpy.arange(number_of_bins)[None,:],axis=1)
+    weighted_power = numpy.concatenate((numpy.zeros((len(samples),1)),weighted_power),axis=1)
+    band_weights = weighted_power[rows,band_stops[:,0]] - weighted_power[rows,band_starts[:,0]]
+
+    amplitudes = 2*numpy.sqrt(band_powers[:,0]/(samples.shape[1]*numpy.sum(window_values**2)))
+    with numpy.errstate(invalid="ignore",divide="ignore"):
+        fundamentals = numpy.where(band_powers[:,0] > 0,band_weights/band_powers[:,0],fundamental_bins)*frequency_step
+        thd = numpy.sqrt(band_powers[:,1:].sum(axis=1)/band_powers[:,0])
+    return((fundamentals,amplitudes,thd))
+#----------------------------------------END Spectra----------------------------------------#}}}
+
+#----------------------------------------Analyze Traces----------------------------------------#{{{1
+def analysis_table(columns,measures):
+    """Returns a numpy structured array of the given (name,dtype,values) key columns followed by a float64 column
+        for each of the measures dictionary's arrays, in analysis_measures order"""
+    measure_names = [name for name in analysis_measures if name in measures]
+    dtype = [(name,column_dtype) for name, column_dtype, values in columns]
+    dtype += [(name,numpy.float64) for name in measure_names]
+    number_of_rows = len(columns[0][2]) if columns != [] else len(measures[measure_names[0]])
+    table = numpy.zeros(number_of_rows,dtype=dtype)
+    for name, column_dtype, values in columns:
+        table[name] = values
+    for name in measure_names:
+        table[name] = measures[name]
+    return(table)
+
+def measure_samples(grid,samples,fundamental=None,harmonics=9,window="hann",low=0.1,high=0.9):
+    """Returns a dictionary of every one of the analysis_measures as an array with one value per row of samples"""
+    measures = {}
+    measures["initial_value"], measures["final_value"] = step_levels(samples)
+    measures["minimum"] = samples.min(axis=1)
+    measures["maximum"] = samples.max(axis=1)
+    measures["overshoot"] = overshoots(samples)
+    measures["rise_time"] = rise_times(grid,samples,low,high)
+    measures["fall_time"] = fall_times(grid,samples,low,high)
+    fundamentals, amplitudes, thd = harmonic_distortion(grid,samples,fundamental,harmonics,window)
+    measures["fundamental"] = fundamentals
+    measures["fundamental_amplitude"] = amplitudes
+    measures["thd"] = thd
+    return(measures)
+
+def analyze_traces(independent_values_list,node_values_list,number_of_samples=1024,start=None,stop=None,
+                   fundamental=None,harmonics=9,window="hann",low=0.1,high=0.9):
+    """Resamples the runs (see resample_traces) and measures them all at once. Returns a structured array with a
+        row per run and a float64 column for each of the analysis_measures. Runs that don't cover the whole grid
+        give nan for the measures that need every sample"""
+    grid, samples = resample_traces(independent_values_list,node_values_list,number_of_samples,start,stop)
+    measures = measure_samples(grid,samples,fundamental,harmonics,window,low,high)
+    return(analysis_table([("run",numpy.int64,numpy.arange(len(samples)))],measures))
+#----------------------------------------END Analyze Traces----------------------------------------#}}}
+
+#----------------------------------------Analyze Sweep----------------------------------------#{{{1
+def split_steps(independent_values,node_values,step_starts):
+    """Returns a list of (independent_values,node_values) views, one per step"""
+    step_stops = list(step_starts[1:]) + [len(independent_values)]
+    return([(independent_values[step_start:step_stop],node_values[step_start:step_stop])
+            for step_start, step_stop in zip(step_starts,step_stops)])
+
+def analyze_runs(runs,number_of_samples=1024,start=None,stop=None,fundamental=None,harmonics=9,window="hann",
+                 low=0.1,high=0.9):
+    """Measures a list of (index,parameters,steps) runs, where steps is a list of (independent_values,node_values)
+        or None for a failed run, in one batch. Returns the structured array of analyze_sweep"""
+    keys = []
+    independent_values_list = []
+    node_values_list = []
+    for index, parameters, steps in runs:
+        for step_number, (independent_values, node_values) in enumerate(steps or []):
+            keys.append((index,step_number,parameters))
+            independent_values_list.append(independent_values)
+            node_values_list.append(node_values)
+    if independent_values_list != []:
+        grid, samples = resample_traces(independent_values_list,node_values_list,number_of_samples,start,stop)
+        measures = measure_samples(grid,samples,fundamental,harmonics,window,low,high)
+    else:
+        measures = dict([(name,numpy.empty(0)) for name in analysis_measures])
+
+    #failed runs get a row of nan so every run shows up in the table
+    failed_keys = [(index,0,parameters) for index, parameters, steps in runs if steps == None]
+    if failed_keys != []:
+        keys += failed_keys
+        for name in analysis_measures:
+            measures[name] = numpy.concatenate((measures[name],numpy.full(len(failed_keys),numpy.nan)))
+
+    variables = []
+    for index, step_number, parameters in keys:
+        variables += [variable for variable in parameters if variable not in variables]
+    columns = [("index",numpy.int64,[key[0] for key in keys]),("step",numpy.int64,[key[1] for key in keys])]
+    for variable in variables:
+        values = [str(key[2].get(variable,"")) for key in keys]
+        columns.append((variable,"U{}".format(max([len(value) for value in values]+[1])),values))
+    table = analysis_table(columns,measures)
+    return(table[numpy.lexsort((table["step"],table["index"]))])
+
+def analyze_sweep(results,node,independent_node=None,number_of_samples=1024,start=None,stop=None,fundamental=None,
+                  harmonics=9,window="hann",low=0.1,high=0.9):
+    """Measures the node in every run and step of a sweep (sweep_result_classes from run_sweep or
+        run_distributed_sweep) in one batch, see analyze_traces. Returns a numpy structured array sorted by index and
+        step, with index and step columns, a string column for each swept variable and a float64 column for each of
+        the analysis_measures. Failed runs get one row of nan. independent_node defaults to each run's own"""
+    runs = []
+    for result in results:
+        raw_values = result.raw_values
+        if result.exception != None or raw_values == None:
+            runs.append((result.index,result.parameters,None))
+            continue
+        if independent_node == None:
+            independent_values = raw_values.independent_node.values
+        else:
+            independent_values = raw_values.node_values[independent_node].values
+        steps = split_steps(independent_values,raw_values.node_values[node].values,raw_values.step_starts)
+        runs.append((result.index,result.parameters,steps))
+    return(analyze_runs(runs,number_of_samples,start,stop,fundamental,harmonics,window,low,high))
+
+def analyze_store(store,node,independent_node=None,runs=None,number_of_samples=1024,start=None,stop=None,
+                  fundamental=None,harmonics=9,window="hann",low=0.1,high=0.9):
+    """Like analyze_sweep for the given run numbers (default all written runs) of a sweep_store_class, loading only
+        the node and the independent node (default the first node stored, ie time). The index column holds the run
+        numbers"""
+    if independent_node == None:
+        independent_node = store.nodes[0]
+    if runs == None:
+        runs = [run["run"] for run in store.runs]
+    loaded = store.load(runs,[independent_node,node])
+    store_runs = []
+    for run_number in runs:
+        run = store.runs[run_number]
+        values = loaded[run_number]
+        if independent_node not in values or node not in values or run["length"] == 0:
+            store_runs.append((run_number,run["parameters"],None))
+            continue
+        steps = split_steps(values[independent_node],values[node],run["step_starts"])
+        store_runs.append((run_number,run["parameters"],steps))
+    return(analyze_runs(store_runs,number_of_samples,start,stop,fundamental,harmonics,window,low,high))
+#----------------------------------------END Analyze Sweep----------------------------------------#}}}
@@ -0,0 +1,142 @@
+#!/usr/bin/python
+# Python Code for caching the parsed results of LTSpice runs on disk. Results are keyed on a hash of the
+# rendered netlist lines, the simulator version, and the contents of any included model files
+import os
+import json
+import time
+import pickle
+import hashlib
+
+#bumped whenever the pickled raw_values_class changes shape so older entries are never loaded
+cache_format_version = "4"
+
+#----------------------------------------Find Simulator Version----------------------------------------#{{{1
+def find_simulator_version():
+    """Returns a string identifying the installed simulator. Uses the LTSPICE_VERSION environment variable if set,
+        otherwise the size and modification time of scad3.exe in the LTspiceIV directory used by run_netlist.sh"""
+    if "LTSPICE_VERSION" in os.environ:
+        return(os.environ["LTSPICE_VERSION"])
+    c_drive = os.environ.get("C_DRIVE",os.path.expanduser("~/.wine/drive_c"))
+    executable = os.path.join(c_drive,"Program Files","LTC","LTspiceIV","scad3.exe")
+    if os.path.exists(executable):
+        executable_stat = os.stat(executable)
+        return("scad3.exe {} {}".format(executable_stat.st_size,int(executable_stat.st_mtime)))
+    return("unknown")
+#----------------------------------------END Find Simulator Version----------------------------------------#}}}
+
+#----------------------------------------Simulation Cache Class----------------------------------------#{{{1
+class simulation_cache_class:
+    """An on-disk cache of parsed simulation results. Each entry is a pickled raw_values_class stored under the
+        hash of what went into the run. Keeps an index of entry sizes and last use times so the least recently used
+        entries are evicted once the cache is over max_bytes, and counts hits, misses and simulation time saved"""
+    def __init__(self,directory,max_bytes=2**30,simulator_version=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if simulator_version == None:
+            simulator_version = find_simulator_version()
+        self.simulator_version = simulator_version
+        self.index_filename = os.path.join(directory,"index.json")
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.read_index()
+
+    def __repr__(self):
+        return("simulation cache {}: {} entries, {} hits, {} misses, {:.1f} s saved".format(
+            self.directory,len(self.entries),self.stats["hits"],self.stats["misses"],self.stats["time_saved"]))
+    def __str__(self):
+        return(self.__repr__())
+
+    def read_index(self):
+        """Reads the entries and stats from the index file, starting empty if there isn't one"""
+        self.entries = {}
+        self.stats = {"hits":0,"misses":0,"time_saved":0.0}
+        if os.path.exists(self.index_filename):
+            file = open(self.index_filename,"r")
+            index = json.load(file)
+            file.close()
+            self.entries = index["entries"]
+            self.stats = index["stats"]
+
+    def write_index(self):
+        """Writes the entries and stats to the index file. Written to a temporary file and moved into place so
+            a reader never sees half an index"""
+        temporary_filename = "{}.{}".format(self.index_filename,os.getpid())
+        file = open(temporary_filename,"w")
+        json.dump({"entries":self.entries,"stats":self.stats},file)
+        file.close()
+        os.replace(temporary_filename,self.index_filename)
+
+    def netlist_key(self,netlist):
+        """Returns the cache key for the netlist: the sha256 of its rendered lines, the simulator version, the
+            cache format version, the nodes it reads and the contents of its included files (hashed once per file
+            change, see resolve_includes)"""
+        key_hash = hashlib.sha256()
+        key_hash.update("\n".join(netlist.lines).encode("utf-8"))
+        key_hash.update(self.simulator_version.encode("utf-8"))
+        key_hash.update(cache_format_version.encode("utf-8"))
+        key_hash.update(repr(netlist.selected_nodes).encode("utf-8"))
+        for included_file in netlist.resolve_includes():
+            key_hash.update(included_file.filename.encode("utf-8"))
+            key_hash.update(included_file.content_hash.encode("utf-8"))
+        for include_name in netlist.missing_includes:
+            key_hash.update(include_name.encode("utf-8"))
+        return(key_hash.hexdigest())
+
+    def entry_filename(self,key):
+        return(os.path.join(self.directory,key+".pickle"))
+
+    def get(self,key):
+        """Returns the stored raw_values_class for the key, or None if it isn't cached"""
+        if key not in self.entries or not os.path.exists(self.entry_filename(key)):
+            self.entries.pop(key,None)
+            return(None)
+        file = open(self.entry_filename(key),"rb")
+        raw_values = pickle.load(file)
+        file.close()
+        self.entries[key]["last_used"] = time.time()
+        return(raw_values)
+
+    def put(self,key,raw_values,run_time):
+        """Stores the raw_values_class under the key along with how long the run took, then evicts old entries"""
+        file = open(self.entry_filename(key),"wb")
+        pickle.dump(raw_values,file,protocol=pickle.HIGHEST_PROTOCOL)
+        file.close()
+        self.entries[key] = {"size":os.path.getsize(self.entry_filename(key)),"last_used":time.time(),
+                             "run_time":run_time}
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in max_bytes"""
+        total_bytes = sum([entry["size"] for entry in self.entries.values()])
+        for key in sorted(self.entries,key=lambda key: self.entries[key]["last_used"]):
+            if total_bytes <= self.max_bytes:
+                break
+            total_bytes -= self.entries[key]["size"]
+            del self.entries[key]
+            if os.path.exists(self.entry_filename(key)):
+                os.remove(self.entry_filename(key))
+
+    def run(self,netlist,raise_errors=False,simulator=None):
+        """Returns the cached results for the netlist if there are any, otherwise runs it and caches the results"""
+        key = self.netlist_key(netlist)
+        raw_values = self.get(key)
+        if raw_values != None:
+            self.stats["hits"] += 1
+            self.stats["time_saved"] += self.entries[key]["run_time"]
+        else:
+            self.stats["misses"] += 1
+            start_time = time.time()
+            raw_values = netlist.run_netlist(raise_errors=raise_errors,simulator=simulator)
+            self.put(key,raw_values,time.time()-start_time)
+        self.write_index()
+        return(raw_values)
+
+    def clear(self):
+        """Removes every entry and resets the stats"""
+        for key in list(self.entries):
+            if os.path.exists(self.entry_filename(key)):
+                os.remove(self.entry_filename(key))
+        self.entries = {}
+        self.stats = {"hits":0,"misses":0,"time_saved":0.0}
+        self.write_index()
+#----------------------------------------END Simulation Cache Class----------------------------------------#}}}
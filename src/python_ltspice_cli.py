@@ -0,0 +1,146 @@
+#!/usr/bin/python
+# Python Code for running netlists and sweeps from the command line. A sweep is described by a json spec file and
+# its results are printed as json lines, one per sweep point as it finishes, ie
+#   python -m python_ltspice_cli sweep spec.json --output results.jsonl
+#   python -m python_ltspice_cli run circuit.net
+import os
+import sys
+import json
+import argparse
+from python_ltspice_tools import netlist_class, simulator_class
+from python_ltspice_instrument import instrumentation, json_trace_hook_class
+
+#spec keys that name files, found relative to the spec file
+spec_path_keys = ("netlist","working_directory","store","trace")
+
+#----------------------------------------Read Sweep Spec----------------------------------------#{{{1
+def read_sweep_spec(spec_filename):
+    """Reads a json sweep spec. Keys are
+        netlist: the .net file (required)
+        parameters: a grid dictionary of value lists, or a list of variable value dictionaries (required)
+        nodes: node names or patterns to read from the .raw, see netlist_class.select_nodes
+        measurements_only: if true only the .log's .meas results are read
+        shared_results: if true the traces come back from local workers through shared memory
+        max_workers, working_directory: as for run_sweep
+        store: a sweep_store_class directory the results are appended to, runs_per_shard: its shard size
+        simulator: ltspice_directory, wine and executable of a simulator_class, otherwise run_netlist.sh is used
+        distributed: address ("host:port"), local_workers, authkey, max_attempts, job_timeout and worker_timeout to
+            run the sweep through a sweep coordinator instead of a local process pool
+        trace: a file every stage is written to, see json_trace_hook_class
+        Relative filenames are taken relative to the spec file"""
+    file = open(spec_filename,"r")
+    spec = json.load(file)
+    file.close()
+    for key in ("netlist","parameters"):
+        if key not in spec:
+            raise ValueError("sweep spec {} has no {}".format(spec_filename,key))
+    spec_directory = os.path.dirname(os.path.abspath(spec_filename))
+    for key in spec_path_keys:
+        if spec.get(key) != None:
+            spec[key] = os.path.join(spec_directory,os.path.expanduser(spec[key]))
+    return(spec)
+#----------------------------------------END Read Sweep Spec----------------------------------------#}}}
+
+#----------------------------------------Sweep Result Dictionary----------------------------------------#{{{1
+def sweep_result_dictionary(result):
+    """Returns a json ready dictionary of a sweep_result_class: the index, parameters, error (None if the run
+        worked), the .meas results with one value per step, and the last value of every node that was read"""
+    result_dictionary = {"index":result.index,"parameters":result.parameters,"error":None,"measurements":{},
+                         "final_values":{}}
+    if result.exception != None:
+        result_dictionary["error"] = str(result.exception)
+        return(result_dictionary)
+    if result.log_values != None:
+        for name, values in result.log_values.measurements.items():
+            result_dictionary["measurements"][name] = values.tolist()
+    if result.raw_values != None:
+        for node, node_value in result.raw_values.node_values.items():
+            if len(node_value.values) > 0:
+                result_dictionary["final_values"][node] = float(node_value.values[-1].real)
+    return(result_dictionary)
+#----------------------------------------END Sweep Result Dictionary----------------------------------------#}}}
+
+#----------------------------------------Run Sweep Spec----------------------------------------#{{{1
+def run_sweep_spec(spec):
+    """Runs the sweep a spec dictionary (see read_sweep_spec) describes. Yields a sweep_result_class for each
+        point as it finishes. The sweep modules are only imported here so the run command never loads them"""
+    from python_ltspice_sweep import run_sweep, sweep_point_runner_class
+    netlist = netlist_class(spec["netlist"])
+    if spec.get("nodes") != None:
+        netlist.select_nodes(spec["nodes"])
+    simulator = simulator_class(**spec["simulator"]) if spec.get("simulator") != None else None
+    run_function = sweep_point_runner_class(simulator,read_raw=not spec.get("measurements_only",False))
+    store = None
+    if spec.get("store") != None:
+        from python_ltspice_store import sweep_store_class
+        store = sweep_store_class(spec["store"],runs_per_shard=spec.get("runs_per_shard",100))
+
+    try:
+        if spec.get("distributed") != None:
+            from python_ltspice_distributed import run_distributed_sweep
+            distributed = dict(spec["distributed"])
+            host, port = distributed.pop("address","localhost:0").rsplit(":",1)
+            results = run_distributed_sweep(netlist,spec["parameters"],address=(host,int(port)),
+                                            working_directory=spec.get("working_directory"),store=store,
+                                            run_function=run_function,
+                                            shared_results=spec.get("shared_results",False),**distributed)
+            for result in results:
+                yield(result)
+        else:
+            results = run_sweep(netlist,spec["parameters"],max_workers=spec.get("max_workers"),
+                                working_directory=spec.get("working_directory"),run_function=run_function,
+                                shared_results=spec.get("shared_results",False))
+            for result in results:
+                if store != None and result.exception == None:
+                    store.append(result.parameters,result.raw_values,result.log_values)
+                yield(result)
+    finally:
+        if store != None:
+            store.close()
+#----------------------------------------END Run Sweep Spec----------------------------------------#}}}
+
+#----------------------------------------Main----------------------------------------#{{{1
+def main(arguments=None):
+    """Command line entry point, returns the exit status: 0 if every run worked, otherwise 1"""
+    parser = argparse.ArgumentParser(prog="python_ltspice",description="Run LTSpice netlists and sweeps")
+    parser.add_argument("--summary",default=None,help="write the stage timings and counters to this json file")
+    commands = parser.add_subparsers(dest="command",required=True)
+    sweep_parser = commands.add_parser("sweep",help="run the sweep a json spec file describes")
+    sweep_parser.add_argument("spec",help="json sweep spec, see read_sweep_spec")
+    sweep_parser.add_argument("--output",default=None,help="write the json lines here instead of stdout")
+    run_parser = commands.add_parser("run",help="run one netlist and print the last value of each node")
+    run_parser.add_argument("netlist",help=".net file in the LTspiceIV directory")
+    run_parser.add_argument("--direct",action="store_true",
+                            help="launch LTspice with a simulator_class instead of run_netlist.sh")
+    arguments = parser.parse_args(arguments)
+
+    failures = 0
+    if arguments.command == "sweep":
+        spec = read_sweep_spec(arguments.spec)
+        if spec.get("trace") != None:
+            instrumentation.add_hook(json_trace_hook_class(spec["trace"]))
+        output = open(arguments.output,"w") if arguments.output != None else sys.stdout
+        points = 0
+        for result in run_sweep_spec(spec):
+            output.write(json.dumps(sweep_result_dictionary(result),default=str)+"\n")
+            output.flush()
+            points += 1
+            if result.exception != None:
+                failures += 1
+        if output is not sys.stdout:
+            output.close()
+        sys.stderr.write("{} points, {} failed\n".format(points,failures))
+    elif arguments.command == "run":
+        simulator = simulator_class() if arguments.direct == True else None
+        netlist = netlist_class(os.path.abspath(arguments.netlist))
+        raw_values = netlist.run_netlist(raise_errors=True,simulator=simulator)
+        for node, node_value in raw_values.node_values.items():
+            print(node,node_value.values[-1])
+
+    if arguments.summary != None:
+        instrumentation.write_summary(arguments.summary)
+    return(0 if failures == 0 else 1)
+#----------------------------------------END Main----------------------------------------#}}}
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,330 @@
+#!/usr/bin/python
+# Python Code for running a sweep across several machines. A coordinator hands the rendered sweep point netlists
+# out to worker processes over authenticated sockets, requeues the points of workers that are lost, and collects
+# the results in one place. Workers can be started on other hosts with
+#   python python_ltspice_distributed.py coordinator_host:port --processes 4 --authkey <key>
+import os
+import sys
+import time
+import queue
+import threading
+import itertools
+import collections
+from python_ltspice_sweep import parameter_grid, sweep_point_filename, sweep_result_class, run_sweep_point
+from python_ltspice_sweep import run_sweep_point_measurements
+from python_ltspice_shared import shared_result_runner_class, make_shared_directory, remove_shared_directory
+from python_ltspice_lazy import lazy_import
+
+multiprocessing = lazy_import("multiprocessing.connection",globals())
+
+#----------------------------------------Worker Lost Exception----------------------------------------#{{{1
+class WorkerLostException(Exception):
+    """An exception class for when a sweep point was handed out max_attempts times and every worker running it
+        disconnected or took longer than the job timeout, or when no worker was left to run it"""
+    def __init__(self,index,attempts,reason=None):
+        self.index = index
+        self.attempts = attempts
+        self.reason = reason
+    def __repr__(self):
+        if self.reason != None:
+            return("WorkerLostError: sweep point {} {}".format(self.index,self.reason))
+        error_string = "WorkerLostError: sweep point {} was lost by {} workers".format(self.index,self.attempts)
+        return(error_string)
+    def __str__(self):
+        return(self.__repr__())
+#----------------------------------------END Worker Lost Exception----------------------------------------#}}}
+
+#----------------------------------------Find Authkey----------------------------------------#{{{1
+def find_authkey(authkey=None):
+    """Returns the key workers use to authenticate with the coordinator as bytes. Uses the LTSPICE_SWEEP_AUTHKEY
+        environment variable if no key is given, otherwise a random key (only usable by local workers)"""
+    if authkey == None:
+        authkey = os.environ.get("LTSPICE_SWEEP_AUTHKEY")
+    if authkey == None:
+        return(os.urandom(16))
+    if isinstance(authkey,str):
+        authkey = authkey.encode("utf-8")
+    return(authkey)
+#----------------------------------------END Find Authkey----------------------------------------#}}}
+
+#----------------------------------------Sweep Coordinator Class----------------------------------------#{{{1
+class sweep_coordinator_class:
+    """Listens on address for sweep workers (see run_sweep_worker) and hands them sweep points. Each worker runs
+        one point at a time; a point whose worker disconnects, or runs longer than job_timeout seconds, is handed to
+        another worker, up to max_attempts times. A timed out worker is disconnected and reconnects once its run ends,
+        its late result is thrown away. Workers may join or leave at any time, and stay connected between calls of
+        run so a coordinator can serve several sweeps (ie the batches of an optimizer). If no worker is connected for
+        worker_timeout seconds while points are left, those points fail with a WorkerLostException (None waits
+        for workers forever). Errors reported in a run's .log aren't retried since they'd just happen again"""
+    def __init__(self,address=("localhost",0),authkey=None,max_attempts=3,job_timeout=None,worker_timeout=60):
+        self.authkey = find_authkey(authkey)
+        self.max_attempts = max_attempts
+        self.job_timeout = job_timeout
+        self.worker_timeout = worker_timeout
+        self.listener = multiprocessing.connection.Listener(address,authkey=self.authkey)
+        self.address = self.listener.address
+        self.new_connections = queue.Queue()
+        self.connections = []
+        self.closed = False
+        self.accept_thread = threading.Thread(target=self.accept,name="sweep coordinator {}".format(self.address))
+        self.accept_thread.daemon = True
+        self.accept_thread.start()
+
+    def __repr__(self):
+        return("sweep coordinator on {}: {} workers".format(self.address,len(self.connections)))
+    def __str__(self):
+        return(self.__repr__())
+
+    def __enter__(self):
+        return(self)
+    def __exit__(self,exception_type,exception,traceback):
+        self.close()
+
+    def accept(self):
+        """Accept loop: queues each authenticated worker connection until the listener is closed"""
+        while self.closed == False:
+            try:
+                connection = self.listener.accept()
+            except multiprocessing.AuthenticationError:
+                continue
+            except OSError:
+                break
+            self.new_connections.put(connection)
+
+    def add_new_connections(self):
+        while True:
+            try:
+                self.connections.append(self.new_connections.get_nowait())
+            except queue.Empty:
+                return
+
+    def drop(self,connection):
+        """Forgets a worker connection that failed or timed out"""
+        if connection in self.connections:
+            self.connections.remove(connection)
+        try:
+            connection.close()
+        except OSError:
+            pass
+
+    def run(self,netlist,parameter_points,working_directory=None,store=None,poll_time=0.2):
+        """Runs the netlist once for every variable value dictionary in parameter_points (a list of dictionaries or a
+            grid dictionary of lists, see parameter_grid) on the connected workers. Point netlists are rendered from
+            a template just before they're sent. Yields a sweep_result_class for each point as it finishes, once per
+            point even if it was run twice. If a sweep_store_class is given as store, the successful results are
+            appended to it as they arrive so the whole sweep ends up in one store"""
+        if isinstance(parameter_points,dict):
+            parameter_points = parameter_grid(parameter_points)
+        template = netlist.compile_template()
+        point_iterator = enumerate(parameter_points)
+        retries = collections.deque()
+        attempts = {}
+        running = {}
+        finished = set()
+        points_left = True
+        no_workers_time = None
+
+        while True:
+            self.add_new_connections()
+            #hand a point to every idle worker, retried points first
+            for connection in [connection for connection in self.connections if connection not in running]:
+                if len(retries) > 0:
+                    index, parameters = retries.popleft()
+                elif points_left == True:
+                    try:
+                        index, parameters = next(point_iterator)
+                    except StopIteration:
+                        points_left = False
+                        break
+                else:
+                    break
+                point_filename = sweep_point_filename(netlist,index,working_directory)
+                point_netlist = template.make_netlist(parameters,new_filename=point_filename)
+                attempts[index] = attempts.get(index,0) + 1
+                try:
+                    connection.send(("job",index,point_netlist))
+                    running[connection] = (index,parameters,time.time())
+                except (OSError,EOFError):
+                    self.drop(connection)
+                    retries.appendleft((index,parameters))
+                    attempts[index] -= 1
+            if points_left == False and len(retries) == 0 and len(running) == 0:
+                break
+
+            #with no worker to run the points left, give up on them once none has connected for worker_timeout
+            if len(self.connections) > 0 or self.worker_timeout == None:
+                no_workers_time = None
+            elif no_workers_time == None:
+                no_workers_time = time.time()
+            elif time.time()-no_workers_time > self.worker_timeout:
+                reason = "wasn't run, no workers were connected for {} s".format(self.worker_timeout)
+                for index, parameters in itertools.chain(retries,point_iterator):
+                    finished.add(index)
+                    exception = WorkerLostException(index,attempts.get(index,0),reason)
+                    yield(sweep_result_class(index,parameters,exception=exception))
+                break
+
+            lost = []
+            if len(running) > 0:
+                ready = multiprocessing.connection.wait(list(running),timeout=poll_time)
+            else:
+                ready = []
+                time.sleep(poll_time)
+            for connection in ready:
+                try:
+                    message = connection.recv()
+                except (OSError,EOFError):
+                    lost.append(connection)
+                    continue
+                index, parameters, start_time = running.pop(connection)
+                kind, result_index, raw_values, exception = message
+                if result_index in finished:
+                    continue
+                finished.add(result_index)
+                result = sweep_result_class(index,parameters,raw_values=raw_values,exception=exception)
+                if store != None and exception == None:
+                    store.append(parameters,result.raw_values,result.log_values)
+                yield(result)
+            if self.job_timeout != None:
+                for connection, (index, parameters, start_time) in running.items():
+                    if time.time()-start_time > self.job_timeout and connection not in lost:
+                        lost.append(connection)
+
+            #requeue the points of lost workers, or give up on them after max_attempts
+            for connection in lost:
+                index, parameters, start_time = running.pop(connection)
+                self.drop(connection)
+                if index in finished:
+                    continue
+                if attempts[index] < self.max_attempts:
+                    retries.append((index,parameters))
+                else:
+                    finished.add(index)
+                    yield(sweep_result_class(index,parameters,exception=WorkerLostException(index,attempts[index])))
+
+    def close(self):
+        """Tells the connected workers to stop and stops listening"""
+        self.closed = True
+        self.add_new_connections()
+        for connection in list(self.connections):
+            try:
+                connection.send(("stop",))
+            except (OSError,EOFError):
+                pass
+            self.drop(connection)
+        self.listener.close()
+#----------------------------------------END Sweep Coordinator Class----------------------------------------#}}}
+
+#----------------------------------------Run Sweep Worker----------------------------------------#{{{1
+def connect_to_coordinator(address,authkey=None,connect_timeout=60):
+    """Returns a connection to the sweep coordinator at address, trying for connect_timeout seconds before raising
+        the ConnectionRefusedError"""
+    start_time = time.time()
+    while True:
+        try:
+            return(multiprocessing.connection.Client(address,authkey=find_authkey(authkey)))
+        except ConnectionRefusedError:
+            if time.time()-start_time > connect_timeout:
+                raise
+            time.sleep(0.5)
+
+def run_sweep_worker(address,authkey=None,working_directory=None,run_function=run_sweep_point,connect_timeout=60):
+    """Connects to the sweep coordinator at address and runs the sweep points it sends until it says stop or can't
+        be reached. If working_directory is given each point netlist is moved into it (ie the LTspiceIV directory of
+        another machine), otherwise it's run where the coordinator named it, which suits shared or local disks. Files
+        the netlist includes have to be at the same place on every machine. Keeps trying to connect for
+        connect_timeout seconds so workers can be started before the coordinator. If the connection is lost (ie the
+        coordinator dropped it because a run passed the job timeout) the result is thrown away and the worker
+        reconnects, for up to connect_timeout seconds, rather than leaving the sweep"""
+    connection = connect_to_coordinator(address,authkey,connect_timeout)
+    try:
+        while True:
+            try:
+                message = connection.recv()
+            except (OSError,EOFError):
+                connection.close()
+                try:
+                    connection = connect_to_coordinator(address,authkey,connect_timeout)
+                except ConnectionRefusedError:
+                    return
+                continue
+            if message[0] == "stop":
+                break
+            kind, index, point_netlist = message
+            if working_directory != None:
+                point_netlist.set_filename(os.path.join(working_directory,point_netlist.name))
+            try:
+                reply = ("result",index,run_function(point_netlist),None)
+            except Exception as exception:
+                reply = ("result",index,None,exception)
+            try:
+                connection.send(reply)
+            except (OSError,EOFError):
+                #reconnects when the next recv fails too
+                continue
+            except Exception as exception:
+                #the results or exception couldn't be pickled
+                connection.send(("result",index,None,RuntimeError(repr(exception))))
+    finally:
+        connection.close()
+#----------------------------------------END Run Sweep Worker----------------------------------------#}}}
+
+#----------------------------------------Start Local Workers----------------------------------------#{{{1
+def start_local_workers(address,authkey,number_of_workers,working_directory=None,run_function=run_sweep_point):
+    """Starts number_of_workers sweep worker processes on this machine and returns the multiprocessing.Process
+        objects. run_function has to be importable by the worker processes"""
+    workers = []
+    for worker_number in range(number_of_workers):
+        worker = multiprocessing.Process(target=run_sweep_worker,args=(address,authkey,working_directory,run_function),
+                                         name="sweep worker {}".format(worker_number))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+    return(workers)
+#----------------------------------------END Start Local Workers----------------------------------------#}}}
+
+#----------------------------------------Run Distributed Sweep----------------------------------------#{{{1
+def run_distributed_sweep(netlist,parameter_points,address=("localhost",0),authkey=None,local_workers=0,
+                          working_directory=None,store=None,max_attempts=3,job_timeout=None,worker_timeout=60,
+                          run_function=run_sweep_point,shared_results=False):
+    """Runs a sweep through a sweep_coordinator_class listening on address, with local_workers worker processes on
+        this machine plus any remote workers pointed at the address. Yields a sweep_result_class for each point as it
+        finishes, and appends the successful results to store if one is given. The coordinator and local workers are
+        shut down at the end. With shared_results True the local workers send their traces back through shared
+        memory (see python_ltspice_shared), remote workers always pickle them"""
+    shared_directory = None
+    if shared_results == True:
+        shared_directory = make_shared_directory()
+        run_function = shared_result_runner_class(run_function,shared_directory)
+    coordinator = sweep_coordinator_class(address,authkey,max_attempts,job_timeout,worker_timeout)
+    workers = start_local_workers(coordinator.address,coordinator.authkey,local_workers,run_function=run_function)
+    try:
+        for result in coordinator.run(netlist,parameter_points,working_directory,store):
+            yield(result)
+    finally:
+        coordinator.close()
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        if shared_directory != None:
+            remove_shared_directory(shared_directory)
+#----------------------------------------END Run Distributed Sweep----------------------------------------#}}}
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run sweep points handed out by a python_ltspice sweep coordinator")
+    parser.add_argument("address",help="host:port of the coordinator")
+    parser.add_argument("--processes",type=int,default=os.cpu_count() or 1,help="worker processes to start")
+    parser.add_argument("--authkey",default=None,help="coordinator key, default $LTSPICE_SWEEP_AUTHKEY")
+    parser.add_argument("--working-directory",default=None,help="directory under LTspiceIV to run the netlists in")
+    parser.add_argument("--measurements-only",action="store_true",help="send back only the .log's .meas results")
+    arguments = parser.parse_args()
+    host, port = arguments.address.rsplit(":",1)
+    if arguments.authkey == None and "LTSPICE_SWEEP_AUTHKEY" not in os.environ:
+        sys.exit("python_ltspice_distributed: give the coordinator's key with --authkey or $LTSPICE_SWEEP_AUTHKEY")
+    run_function = run_sweep_point_measurements if arguments.measurements_only == True else run_sweep_point
+    workers = start_local_workers((host,int(port)),find_authkey(arguments.authkey),arguments.processes,
+                                  arguments.working_directory,run_function)
+    for worker in workers:
+        worker.join()
@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# Python Code for timing the stages of a simulation run (reading and rendering netlists, writing files, wine
+# startup, the LTspice run, reading the .log and .raw) and counting what they process. Always on and cheap: a stage
+# costs a few clock reads and a dictionary update unless hooks are added to export each stage as it finishes
+import os
+import json
+import time
+import functools
+import threading
+
+#----------------------------------------Stage Timer Class----------------------------------------#{{{1
+class stage_timer_class:
+    """Context manager timing one stage, made by instrumentation_class.stage. Records the wall time and the CPU
+        time of the calling thread when the block exits. Extra details (ie the netlist name) are passed to hooks"""
+    __slots__ = ("instrumentation","name","details","start_time","start_cpu_time")
+    def __init__(self,instrumentation,name,details):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.details = details
+
+    def __enter__(self):
+        self.start_cpu_time = time.thread_time()
+        self.start_time = time.perf_counter()
+        return(self)
+    def __exit__(self,exception_type,exception,traceback):
+        wall_time = time.perf_counter() - self.start_time
+        cpu_time = time.thread_time() - self.start_cpu_time
+        self.instrumentation.record_stage(self.name,self.start_time,wall_time,cpu_time,self.details)
+#----------------------------------------END Stage Timer Class----------------------------------------#}}}
+
+#----------------------------------------Instrumentation Class----------------------------------------#{{{1
+class instrumentation_class:
+    """Per process totals of stage timers and counters. Each stage keeps its count, total wall time, total CPU
+        time (of the thread running it) and longest wall time. Counters are plain running totals (ie bytes_read,
+        netlist_lines_parsed, simulator_cpu_time). Hooks are called with a dictionary for every finished stage:
+        name, start (perf_counter seconds), wall_time, cpu_time, process, thread and details.
+        A timed stage costs a few microseconds; set enabled to False to skip even that"""
+    def __init__(self):
+        self.enabled = True
+        self.lock = threading.Lock()
+        self.hooks = []
+        self.reset()
+
+    def __repr__(self):
+        stage_strings = ["{} {}x {:.3f} s".format(name,stage["count"],stage["wall_time"])
+                         for name, stage in self.stages.items()]
+        return("instrumentation: {}".format(", ".join(stage_strings) or "nothing recorded"))
+    def __str__(self):
+        return(self.__repr__())
+
+    def reset(self):
+        """Clears the stage totals and counters, the hooks are kept"""
+        with self.lock:
+            self.stages = {}
+            self.counters = {}
+
+    def stage(self,name,**details):
+        """Returns a context manager that times the block as the named stage, ie
+            with instrumentation.stage("write_file",netlist=self.name): ..."""
+        return(stage_timer_class(self,name,details))
+
+    def timed(self,name):
+        """Decorator timing every call of a function or method as the named stage. The first argument (ie the
+            netlist for methods, the filename for functions) is passed to hooks as the target detail"""
+        def decorator(function):
+            @functools.wraps(function)
+            def timed_function(*arguments,**keyword_arguments):
+                if self.enabled == False:
+                    return(function(*arguments,**keyword_arguments))
+                start_cpu_time = time.thread_time()
+                start_time = time.perf_counter()
+                try:
+                    return(function(*arguments,**keyword_arguments))
+                finally:
+                    wall_time = time.perf_counter() - start_time
+                    cpu_time = time.thread_time() - start_cpu_time
+                    details = {"target":str(arguments[0])} if arguments != () and self.hooks != [] else None
+                    self.record_stage(name,start_time,wall_time,cpu_time,details)
+            return(timed_function)
+        return(decorator)
+
+    def record_stage(self,name,start_time,wall_time,cpu_time,details=None):
+        """Adds a finished stage to the totals and passes it to the hooks"""
+        if self.enabled == False:
+            return
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage == None:
+                stage = {"count":0,"wall_time":0.0,"cpu_time":0.0,"max_wall_time":0.0}
+                self.stages[name] = stage
+            stage["count"] += 1
+            stage["wall_time"] += wall_time
+            stage["cpu_time"] += cpu_time
+            if wall_time > stage["max_wall_time"]:
+                stage["max_wall_time"] = wall_time
+            hooks = self.hooks
+        if hooks != []:
+            event = {"name":name,"start":start_time,"wall_time":wall_time,"cpu_time":cpu_time,"process":os.getpid(),
+                     "thread":threading.get_ident(),"details":details or {}}
+            for hook in hooks:
+                hook(event)
+
+    def count(self,name,amount=1):
+        """Adds amount to the named counter"""
+        if self.enabled == False:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name,0) + amount
+
+    def add_hook(self,hook):
+        """Calls hook(event) for every stage that finishes from now on, see json_trace_hook_class"""
+        with self.lock:
+            self.hooks = self.hooks + [hook]
+
+    def remove_hook(self,hook):
+        with self.lock:
+            self.hooks = [other_hook for other_hook in self.hooks if other_hook is not hook]
+
+    def summary(self):
+        """Returns a json ready dictionary of copies of the stage totals and counters"""
+        with self.lock:
+            stages = dict([(name,dict(stage)) for name, stage in self.stages.items()])
+            return({"stages":stages,"counters":dict(self.counters)})
+
+    def write_summary(self,filename):
+        """Writes the summary to a json file"""
+        file = open(filename,"w")
+        json.dump(self.summary(),file,indent=2)
+        file.close()
+
+#the instrumentation every module records into
+instrumentation = instrumentation_class()
+#----------------------------------------END Instrumentation Class----------------------------------------#}}}
+
+#----------------------------------------JSON Trace Hook Class----------------------------------------#{{{1
+class json_trace_hook_class:
+    """Hook that appends every stage to a trace file in the Chrome trace event format, which chrome://tracing and
+        Perfetto open directly (the closing bracket is optional in that format so it's never written). Events are
+        written one line at a time in append mode, so sweep worker processes forked after the hook was added all
+        write to the same file. Use it as instrumentation.add_hook(json_trace_hook_class("trace.json"))"""
+    def __init__(self,filename):
+        self.filename = filename
+        if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+            file = open(filename,"w")
+            file.write("[\n")
+            file.close()
+
+    def __repr__(self):
+        return("json trace hook {}".format(self.filename))
+    def __str__(self):
+        return(self.__repr__())
+
+    def __call__(self,event):
+        trace_event = {"name":event["name"],"ph":"X","ts":event["start"]*1e6,"dur":event["wall_time"]*1e6,
+                       "pid":event["process"],"tid":event["thread"],
+                       "args":dict(event["details"],cpu_time=event["cpu_time"])}
+        file = open(self.filename,"a")
+        file.write(json.dumps(trace_event,default=str)+",\n")
+        file.close()
+#----------------------------------------END JSON Trace Hook Class----------------------------------------#}}}
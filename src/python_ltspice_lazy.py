@@ -0,0 +1,50 @@
+#!/usr/bin/python
+# Python Code for deferring the import of heavy modules (numpy, asyncio, multiprocessing) until they're first used,
+# so importing python_ltspice_tools in a freshly started worker process only costs what that worker actually uses
+import sys
+import importlib
+
+#----------------------------------------Lazy Module Class----------------------------------------#{{{1
+class lazy_module_class:
+    """Stands in for a module until one of its attributes is used, then imports it. If the namespace (the globals
+        of the importing module) is given the name there is replaced by the real module on first use, so later
+        lookups cost nothing extra. importlib's per module locks make the first use safe from several threads.
+        Like the import statement, a dotted name (ie concurrent.futures) imports the submodule but stands in for
+        the top level package. Any method defined here would hide the module attribute of the same name (ie
+        numpy.load), so the class only has special methods and the loading is done by load_lazy_module"""
+    def __init__(self,name,namespace=None):
+        self.__dict__["_lazy_name"] = name
+        self.__dict__["_lazy_namespace"] = namespace
+        self.__dict__["_lazy_alias"] = name.split(".")[0]
+
+    def __repr__(self):
+        return("lazy module {}".format(self._lazy_name))
+    def __str__(self):
+        return(self.__repr__())
+
+    def __getattr__(self,attribute):
+        return(getattr(load_lazy_module(self),attribute))
+    def __setattr__(self,attribute,value):
+        setattr(load_lazy_module(self),attribute,value)
+    def __dir__(self):
+        return(dir(load_lazy_module(self)))
+
+def load_lazy_module(lazy_module):
+    """Imports the module of a lazy_module_class (once) and puts it in the namespace in place of the stand in"""
+    importlib.import_module(lazy_module._lazy_name)
+    module = sys.modules[lazy_module._lazy_alias]
+    namespace = lazy_module._lazy_namespace
+    if namespace != None and namespace.get(lazy_module._lazy_alias) is lazy_module:
+        namespace[lazy_module._lazy_alias] = module
+    return(module)
+#----------------------------------------END Lazy Module Class----------------------------------------#}}}
+
+#----------------------------------------Lazy Import----------------------------------------#{{{1
+def lazy_import(name,namespace=None):
+    """Returns the named module if it's already imported, otherwise a lazy_module_class that imports it on first
+        use, ie numpy = lazy_import("numpy",globals()) or concurrent = lazy_import("concurrent.futures",globals()).
+        A module that isn't installed raises ModuleNotFoundError on first use rather than at import"""
+    if name in sys.modules:
+        return(sys.modules[name.split(".")[0]])
+    return(lazy_module_class(name,namespace))
+#----------------------------------------END Lazy Import----------------------------------------#}}}
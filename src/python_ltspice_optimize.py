@@ -0,0 +1,236 @@
+#!/usr/bin/python
+# Python Code for searching a netlist's parameters for a target instead of running dense grids. Candidates are
+# evaluated in parallel batches through run_sweep and scored by a function of each run's raw_values_class
+import math
+from python_ltspice_sweep import run_sweep, run_sweep_point
+from python_ltspice_tools import values_at
+from python_ltspice_lazy import lazy_import
+
+numpy = lazy_import("numpy",globals())
+
+#----------------------------------------Node Value Function----------------------------------------#{{{1
+def node_value_function(node,independent_value=None,name_type="node"):
+    """Returns a function of a raw_values_class giving the value of the node, at the given independent value
+        (ie time) if there is one, otherwise its last value (the operating point value for .op runs)"""
+    def node_value(raw_values):
+        node_values = raw_values.return_node_value(node,name_type).values
+        if independent_value == None:
+            return(float(node_values[-1]))
+        return(float(values_at(raw_values.independent_node.values,node_values,[independent_value])[0]))
+    return(node_value)
+#----------------------------------------END Node Value Function----------------------------------------#}}}
+
+#----------------------------------------Measurement Function----------------------------------------#{{{1
+def measurement_function(name,step=0):
+    """Returns a function of a run giving the value of the named .meas result from its .log. Works on the
+        log_values_class of runs made with run_sweep_point_measurements, which skip reading the .raw, as well as on
+        a raw_values_class"""
+    def measurement(run_values):
+        log_values = getattr(run_values,"log_values",run_values)
+        return(log_values.measurement(name,step))
+    return(measurement)
+#----------------------------------------END Measurement Function----------------------------------------#}}}
+
+#----------------------------------------Settling Time Function----------------------------------------#{{{1
+def settling_time_function(node,tolerance=0.02,final_value=None,name_type="node"):
+    """Returns a function of a raw_values_class giving the time after which the node stays within tolerance
+        (a fraction of the final value) of its final value, which defaults to its last value"""
+    def settling_time(raw_values):
+        times = numpy.asarray(raw_values.independent_node.values,dtype=float)
+        node_values = numpy.asarray(raw_values.return_node_value(node,name_type).values,dtype=float)
+        settled_value = node_values[-1] if final_value == None else final_value
+        outside = numpy.flatnonzero(numpy.abs(node_values-settled_value) > abs(tolerance*settled_value))
+        if len(outside) == 0:
+            return(float(times[0]))
+        if outside[-1]+1 >= len(times):
+            return(float("inf"))
+        return(float(times[outside[-1]+1]))
+    return(settling_time)
+#----------------------------------------END Settling Time Function----------------------------------------#}}}
+
+#----------------------------------------Optimize Result Class----------------------------------------#{{{1
+class optimize_result_class:
+    """Container class for the result of a search: the best variable value dictionary found, its function value,
+        the number of simulator runs, and the history of every (variable value dictionary, value) evaluated"""
+    def __init__(self,parameters,value,evaluations,history):
+        self.parameters = parameters
+        self.value = value
+        self.evaluations = evaluations
+        self.history = history
+    def __repr__(self):
+        return("{} -> {} ({} runs)".format(self.parameters,self.value,self.evaluations))
+    def __str__(self):
+        return(self.__repr__())
+#----------------------------------------END Optimize Result Class----------------------------------------#}}}
+
+#----------------------------------------Evaluate Points----------------------------------------#{{{1
+def format_values(variables,values,value_format):
+    """Makes the variable value dictionary for the netlist out of a list of numbers"""
+    return(dict([(variable,value_format.format(value)) for variable, value in zip(variables,values)]))
+
+def evaluate_points(netlist,variables,points,function,max_workers=None,working_directory=None,
+                    value_format="{:.12g}",run_function=run_sweep_point,history=None):
+    """Runs the netlist for every point (a list of numbers, one per variable) in parallel and returns a numpy array
+        of the function of each run's raw_values_class (or log_values_class if the run_function only reads the .log,
+        see measurement_function), in the order given. Failed runs give nan"""
+    parameter_points = [format_values(variables,point,value_format) for point in points]
+    values = numpy.full(len(points),numpy.nan)
+    for result in run_sweep(netlist,parameter_points,max_workers,working_directory,run_function):
+        if result.exception == None:
+            values[result.index] = function(result.raw_values if result.raw_values != None else result.log_values)
+    if history != None:
+        history += list(zip(parameter_points,values.tolist()))
+    return(values)
+#----------------------------------------END Evaluate Points----------------------------------------#}}}
+
+#----------------------------------------Bisect Parameter----------------------------------------#{{{1
+def bisect_parameter(netlist,variable,low,high,function,target=0.0,batch_size=4,tolerance=None,max_iterations=20,
+                     max_workers=None,working_directory=None,value_format="{:.12g}",run_function=run_sweep_point):
+    """Finds the value of one variable between low and high where the function of the run equals the target, ie
+        node_value_function("test") and 2.5 for the Rload giving 2.5 V on the test node. The function must cross the
+        target once in the range. Each iteration runs batch_size points spread over the bracket in parallel and keeps
+        the piece where the crossing is, so the bracket shrinks by batch_size+1 per batch of runs.
+        Stops when the bracket is narrower than tolerance (default 1e-6 of the range) or after max_iterations"""
+    if tolerance == None:
+        tolerance = abs(high-low)*1e-6
+    history = []
+    evaluate = lambda points: evaluate_points(netlist,[variable],[[point] for point in points],function,
+                                              max_workers,working_directory,value_format,run_function,history)
+    low_value, high_value = evaluate([low,high]) - target
+    if numpy.sign(low_value) == numpy.sign(high_value):
+        raise ValueError("bisect_parameter: the function doesn't cross {} between {} and {}".format(target,low,high))
+
+    for iteration in range(max_iterations):
+        if abs(high-low) <= tolerance:
+            break
+        points = numpy.linspace(low,high,batch_size+2)[1:-1]
+        values = evaluate(points) - target
+        all_points = numpy.concatenate(([low],points,[high]))
+        all_values = numpy.concatenate(([low_value],values,[high_value]))
+        for index in range(len(all_points)-1):
+            if all_values[index] == 0 or numpy.sign(all_values[index]) != numpy.sign(all_values[index+1]):
+                low, high = all_points[index], all_points[index+1]
+                low_value, high_value = all_values[index], all_values[index+1]
+                break
+
+    #report whichever end of the final bracket came closest to the target
+    if abs(low_value) <= abs(high_value):
+        best, best_value = low, low_value
+    else:
+        best, best_value = high, high_value
+    return(optimize_result_class({variable:value_format.format(best)},float(best_value+target),len(history),history))
+#----------------------------------------END Bisect Parameter----------------------------------------#}}}
+
+#----------------------------------------Nelder Mead----------------------------------------#{{{1
+def nelder_mead(netlist,variables,start,function,step=None,max_iterations=100,tolerance=1e-6,max_workers=None,
+                working_directory=None,value_format="{:.12g}",run_function=run_sweep_point):
+    """Minimizes the function of the run over the variables with the Nelder-Mead simplex method, starting from the
+        start list of numbers. step is the size of the first simplex along each variable (default 10% of start).
+        The reflection, expansion and both contraction points of each iteration are run together as one parallel
+        batch, as are the points of a shrink, so each iteration costs one round of simulations.
+        Stops when the function values of the simplex are within tolerance of each other or after max_iterations"""
+    history = []
+    evaluate = lambda points: evaluate_points(netlist,variables,points,function,max_workers,working_directory,
+                                              value_format,run_function,history)
+    start = numpy.asarray(start,dtype=float)
+    if step == None:
+        step = numpy.where(start != 0,0.1*start,0.1)
+    step = numpy.broadcast_to(numpy.asarray(step,dtype=float),start.shape)
+    simplex = [start] + [start + numpy.eye(len(start))[index]*step[index] for index in range(len(start))]
+    simplex = numpy.array(simplex)
+    values = numpy.nan_to_num(evaluate(simplex),nan=numpy.inf)
+
+    for iteration in range(max_iterations):
+        order = numpy.argsort(values)
+        simplex, values = simplex[order], values[order]
+        if abs(values[-1]-values[0]) <= tolerance:
+            break
+        centroid = simplex[:-1].mean(axis=0)
+        worst = simplex[-1]
+        candidates = numpy.array([centroid + (centroid-worst),           #reflection
+                                  centroid + 2*(centroid-worst),         #expansion
+                                  centroid + 0.5*(centroid-worst),       #outside contraction
+                                  centroid - 0.5*(centroid-worst)])      #inside contraction
+        reflected, expanded, outside, inside = numpy.nan_to_num(evaluate(candidates),nan=numpy.inf)
+
+        if reflected < values[0]:
+            if expanded < reflected:
+                simplex[-1], values[-1] = candidates[1], expanded
+            else:
+                simplex[-1], values[-1] = candidates[0], reflected
+        elif reflected < values[-2]:
+            simplex[-1], values[-1] = candidates[0], reflected
+        elif reflected < values[-1] and outside <= reflected:
+            simplex[-1], values[-1] = candidates[2], outside
+        elif reflected >= values[-1] and inside < values[-1]:
+            simplex[-1], values[-1] = candidates[3], inside
+        else:
+            #shrink towards the best point
+            simplex[1:] = simplex[0] + 0.5*(simplex[1:]-simplex[0])
+            values[1:] = numpy.nan_to_num(evaluate(simplex[1:]),nan=numpy.inf)
+
+    best = int(numpy.argmin(values))
+    return(optimize_result_class(format_values(variables,simplex[best],value_format),float(values[best]),
+                                 len(history),history))
+#----------------------------------------END Nelder Mead----------------------------------------#}}}
+
+#----------------------------------------Bayesian Optimize----------------------------------------#{{{1
+def expected_improvement(candidates,points,values,length_scale=0.2,noise=1e-6):
+    """Fits a gaussian process with a squared exponential kernel to the (normalized) points and values and returns
+        the expected improvement over the best value at each candidate"""
+    mean_value, value_scale = values.mean(), values.std() or 1.0
+    scaled_values = (values-mean_value)/value_scale
+    kernel = lambda a, b: numpy.exp(-0.5*((a[:,None,:]-b[None,:,:])**2).sum(axis=2)/length_scale**2)
+    covariance = kernel(points,points) + noise*numpy.eye(len(points))
+    cholesky = numpy.linalg.cholesky(covariance)
+    weights = numpy.linalg.solve(cholesky.T,numpy.linalg.solve(cholesky,scaled_values))
+    cross_covariance = kernel(candidates,points)
+    predicted_mean = cross_covariance.dot(weights)
+    solved = numpy.linalg.solve(cholesky,cross_covariance.T)
+    predicted_deviation = numpy.sqrt(numpy.clip(1.0-(solved**2).sum(axis=0),1e-12,None))
+    improvement = scaled_values.min() - predicted_mean
+    z = improvement/predicted_deviation
+    cumulative = 0.5*(1.0+numpy.vectorize(math.erf)(z/math.sqrt(2.0)))
+    density = numpy.exp(-0.5*z**2)/math.sqrt(2.0*math.pi)
+    return(improvement*cumulative + predicted_deviation*density)
+
+def bayesian_optimize(netlist,variables,bounds,function,initial_points=8,iterations=10,batch_size=4,
+                      candidates=2000,seed=None,max_workers=None,working_directory=None,value_format="{:.12g}",
+                      run_function=run_sweep_point):
+    """Minimizes the function of the run over the variables inside bounds (a list of (low,high), one per variable)
+        with a gaussian process model of the function. Starts with initial_points random runs, then each iteration
+        picks the batch_size random candidates with the most expected improvement and runs them in parallel.
+        Each batch pick assumes the earlier picks in the batch came out at the best value so far (constant liar),
+        which spreads the batch out. Good for expensive, smooth functions of a few variables"""
+    random = numpy.random.default_rng(seed)
+    bounds = numpy.asarray(bounds,dtype=float)
+    low, width = bounds[:,0], bounds[:,1]-bounds[:,0]
+    history = []
+    evaluate = lambda unit_points: evaluate_points(netlist,variables,low+unit_points*width,function,max_workers,
+                                                   working_directory,value_format,run_function,history)
+    unit_points = random.random((initial_points,len(variables)))
+    values = evaluate(unit_points)
+
+    for iteration in range(iterations):
+        known = ~numpy.isnan(values)
+        model_points, model_values = unit_points[known], values[known]
+        if len(model_values) == 0:
+            batch = random.random((batch_size,len(variables)))
+        else:
+            candidate_points = random.random((candidates,len(variables)))
+            batch = []
+            for batch_number in range(batch_size):
+                improvement = expected_improvement(candidate_points,model_points,model_values)
+                best_candidate = int(numpy.argmax(improvement))
+                batch.append(candidate_points[best_candidate])
+                model_points = numpy.vstack((model_points,candidate_points[best_candidate]))
+                model_values = numpy.append(model_values,model_values.min())
+                candidate_points = numpy.delete(candidate_points,best_candidate,axis=0)
+            batch = numpy.array(batch)
+        unit_points = numpy.vstack((unit_points,batch))
+        values = numpy.append(values,evaluate(batch))
+
+    best = int(numpy.nanargmin(values))
+    return(optimize_result_class(format_values(variables,low+unit_points[best]*width,value_format),
+                                 float(values[best]),len(history),history))
+#----------------------------------------END Bayesian Optimize----------------------------------------#}}}
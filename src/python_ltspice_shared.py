@@ -0,0 +1,114 @@
+#!/usr/bin/python
+# Python Code for handing the traces of sweep results from worker processes to the parent through shared memory
+# instead of pickling them down the result pipe. The worker copies a run's traces once into a memory backed file
+# and only a small descriptor is pickled; the parent maps the file and gets read only numpy views of the traces.
+# Ownership: the worker owns a trace file until its descriptor is returned, from then on the receiver does. attach
+# maps and removes the file at once, so the memory is freed when the last trace of the result is dropped. Files of
+# results that never arrive (ie a worker that died) are removed with the sweep's directory
+import os
+import copy
+import mmap
+import shutil
+import tempfile
+from python_ltspice_tools import raw_values_class
+from python_ltspice_lazy import lazy_import
+
+numpy = lazy_import("numpy",globals())
+
+#traces start on cache line boundaries within a trace file
+trace_alignment = 64
+
+#----------------------------------------Make Shared Directory----------------------------------------#{{{1
+def make_shared_directory(directory=None):
+    """Makes and returns a new directory for one sweep's trace files. Defaults to a directory in /dev/shm, which
+        is memory backed on linux, otherwise in the temporary directory. Remove it with remove_shared_directory"""
+    if directory == None and os.path.isdir("/dev/shm"):
+        directory = "/dev/shm"
+    return(tempfile.mkdtemp(prefix="python_ltspice_",dir=directory))
+
+def remove_shared_directory(directory):
+    """Removes a shared directory and any trace files in it that were never attached"""
+    shutil.rmtree(directory,ignore_errors=True)
+#----------------------------------------END Make Shared Directory----------------------------------------#}}}
+
+#----------------------------------------Shared Raw Values Class----------------------------------------#{{{1
+class shared_raw_values_class:
+    """Picklable descriptor of a raw_values_class whose traces were copied into a trace file in directory. Holds
+        the filename, the (offset,dtype,length) layout of each trace and the raw_values_class without its traces.
+        Made in the worker, then attach (once) in the receiving process to get the raw_values_class back"""
+    def __init__(self,raw_values,directory):
+        self.layout = []
+        self.size = 0
+        for trace in raw_values.traces:
+            self.layout.append((self.size,trace.dtype.str,len(trace)))
+            self.size += -(-trace.nbytes//trace_alignment)*trace_alignment
+        file_descriptor, self.filename = tempfile.mkstemp(suffix=".traces",dir=directory)
+        try:
+            if self.size > 0:
+                os.ftruncate(file_descriptor,self.size)
+                shared_map = mmap.mmap(file_descriptor,self.size)
+                for trace, (offset,dtype,length) in zip(raw_values.traces,self.layout):
+                    if length > 0:
+                        numpy.frombuffer(shared_map,dtype=dtype,count=length,offset=offset)[:] = trace
+                shared_map.close()
+        except Exception:
+            os.remove(self.filename)
+            raise
+        finally:
+            os.close(file_descriptor)
+        self.raw_values = copy.copy(raw_values)
+        for slot in ("raw_map","traces","node_values","node_index","independent_node"):
+            setattr(self.raw_values,slot,None)
+
+    def __repr__(self):
+        return("shared {}: {} traces, {} bytes in {}".format(self.raw_values,len(self.layout),self.size,
+                                                              self.filename))
+    def __str__(self):
+        return(self.__repr__())
+
+    def attach(self):
+        """Maps the trace file and returns the raw_values_class with its traces as read only views of it. The file
+            is removed as soon as it's mapped (the mapping keeps the memory until the traces are dropped), so a
+            descriptor can only be attached once"""
+        raw_values = self.raw_values
+        if self.size > 0:
+            file = open(self.filename,"rb")
+            raw_values.raw_map = mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ)
+            file.close()
+        os.remove(self.filename)
+        traces = []
+        for offset, dtype, length in self.layout:
+            if length > 0:
+                traces.append(numpy.frombuffer(raw_values.raw_map,dtype=dtype,count=length,offset=offset))
+            else:
+                traces.append(numpy.empty(0,dtype=dtype))
+        raw_values.traces = traces
+        raw_values.index_traces()
+        return(raw_values)
+
+    def release(self):
+        """Removes the trace file without attaching it, for results that are thrown away"""
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+#----------------------------------------END Shared Raw Values Class----------------------------------------#}}}
+
+#----------------------------------------Shared Result Runner Class----------------------------------------#{{{1
+class shared_result_runner_class:
+    """Picklable run_function wrapper for sweep workers. Runs a point with run_function and returns the
+        raw_values_class results as shared_raw_values_class descriptors with their traces in directory. Other
+        results (ie the log_values_class of run_sweep_point_measurements) are returned as they are"""
+    def __init__(self,run_function,directory):
+        self.run_function = run_function
+        self.directory = directory
+
+    def __repr__(self):
+        return("shared result runner: {} into {}".format(self.run_function,self.directory))
+    def __str__(self):
+        return(self.__repr__())
+
+    def __call__(self,point_netlist):
+        result = self.run_function(point_netlist)
+        if isinstance(result,raw_values_class):
+            return(shared_raw_values_class(result,self.directory))
+        return(result)
+#----------------------------------------END Shared Result Runner Class----------------------------------------#}}}
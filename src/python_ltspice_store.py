@@ -0,0 +1,204 @@
+#!/usr/bin/python
+# Python Code for storing the results of a sweep on disk. Traces are kept in compressed, column per node numpy
+# .npz shards of a fixed number of runs, with a json index of each run's parameters, so a sweep can be reloaded
+# and queried one node and a few runs at a time
+import os
+import json
+from python_ltspice_lazy import lazy_import
+
+numpy = lazy_import("numpy",globals())
+
+#----------------------------------------Sweep Store Class----------------------------------------#{{{1
+class sweep_store_class:
+    """A columnar on-disk store of sweep results. Runs are appended with their variable value dictionary and
+        raw_values_class, and written out runs_per_shard at a time as shard_<n>.npz files holding one compressed
+        column per node (the runs of the shard one after the other). The index.json file keeps the node names and,
+        for every run, its parameters, .meas results, shard, and where its values sit in the shard's columns.
+        Loading only decompresses the columns of the nodes asked for, from the shards holding the runs asked for"""
+    def __init__(self,directory,runs_per_shard=100):
+        self.directory = directory
+        self.runs_per_shard = runs_per_shard
+        self.index_filename = os.path.join(directory,"index.json")
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.runs = []
+        self.nodes = []
+        self.shard_count = 0
+        if os.path.exists(self.index_filename):
+            file = open(self.index_filename,"r")
+            index = json.load(file)
+            file.close()
+            self.runs = index["runs"]
+            self.nodes = index["nodes"]
+            self.shard_count = index["shard_count"]
+        self.pending_runs = []
+        self.open_shards = {}
+
+    def __repr__(self):
+        return("sweep store {}: {} runs, {} nodes, {} shards".format(self.directory,len(self),len(self.nodes),
+                                                                  self.shard_count))
+    def __str__(self):
+        return(self.__repr__())
+    def __len__(self):
+        return(len(self.runs)+len(self.pending_runs))
+
+    def __enter__(self):
+        return(self)
+    def __exit__(self,exception_type,exception,traceback):
+        self.close()
+
+    def shard_filename(self,shard_number):
+        return(os.path.join(self.directory,"shard_{}.npz".format(shard_number)))
+
+    def append(self,parameters,raw_values=None,log_values=None):
+        """Adds a run to the store and returns its run number. The .meas results are kept from log_values, or the
+            raw_values_class's log_values if not given, so runs that only read the .log can be stored too.
+            Runs are written to disk once a shard's worth have been appended, or on flush"""
+        traces = {}
+        if raw_values != None:
+            for node, node_value in raw_values.node_values.items():
+                #copy so the pending runs don't keep their .raw files mapped until the shard is written
+                traces[node] = numpy.array(node_value.values)
+                if node not in self.nodes:
+                    self.nodes.append(node)
+        if log_values == None:
+            log_values = getattr(raw_values,"log_values",None)
+        measurements = {}
+        if log_values != None:
+            for name, values in log_values.measurements.items():
+                measurements[name] = [None if numpy.isnan(value) else float(value) for value in values]
+        run_number = len(self)
+        self.pending_runs.append((run_number,parameters,traces,list(getattr(raw_values,"step_starts",[0])),
+                                  measurements))
+        if len(self.pending_runs) >= self.runs_per_shard:
+            self.flush()
+        return(run_number)
+
+    def flush(self):
+        """Writes the pending runs out as a new shard and updates the index"""
+        if self.pending_runs == []:
+            return
+        shard_number = self.shard_count
+        shard_nodes = []
+        for run_number, parameters, traces, step_starts, measurements in self.pending_runs:
+            for node in traces:
+                if node not in shard_nodes:
+                    shard_nodes.append(node)
+
+        #build one column per node, filling in nan where a run doesn't have the node
+        columns = {}
+        offset = 0
+        for run_number, parameters, traces, step_starts, measurements in self.pending_runs:
+            length = len(next(iter(traces.values()))) if traces != {} else 0
+            for node in shard_nodes:
+                if node in traces:
+                    trace = traces[node]
+                else:
+                    trace = numpy.full(length,numpy.nan)
+                columns.setdefault(node,[]).append(trace)
+            self.runs.append({"run":run_number,"parameters":json_parameters(parameters),"shard":shard_number,
+                              "offset":offset,"length":length,"step_starts":step_starts,"measurements":measurements})
+            offset += length
+        for node in shard_nodes:
+            columns[node] = numpy.concatenate(columns[node])
+
+        temporary_filename = self.shard_filename(shard_number)+".tmp.npz"
+        numpy.savez_compressed(temporary_filename,**columns)
+        os.replace(temporary_filename,self.shard_filename(shard_number))
+        self.shard_count += 1
+        self.pending_runs = []
+        self.write_index()
+
+    def write_index(self):
+        """Writes the node names and run records to index.json"""
+        temporary_filename = self.index_filename+".tmp"
+        file = open(temporary_filename,"w")
+        json.dump({"nodes":self.nodes,"shard_count":self.shard_count,"runs":self.runs},file)
+        file.close()
+        os.replace(temporary_filename,self.index_filename)
+
+    def close(self):
+        """Flushes the pending runs and closes any open shards"""
+        self.flush()
+        for shard in self.open_shards.values():
+            shard.close()
+        self.open_shards = {}
+
+    def find_runs(self,where=None):
+        """Returns the run numbers whose parameters match all the variable values in the where dictionary,
+            or every written run if where is None"""
+        run_numbers = []
+        for run in self.runs:
+            if where == None or all([run["parameters"].get(variable) == value for variable, value in where.items()]):
+                run_numbers.append(run["run"])
+        return(run_numbers)
+
+    def run_parameters(self,run_number):
+        """Returns the variable value dictionary of the given run"""
+        return(self.runs[run_number]["parameters"])
+
+    def open_shard(self,shard_number):
+        """Opens a shard lazily, nothing is decompressed until a column is asked for"""
+        if shard_number not in self.open_shards:
+            self.open_shards[shard_number] = numpy.load(self.shard_filename(shard_number))
+        return(self.open_shards[shard_number])
+
+    def load(self,runs=None,nodes=None):
+        """Loads the given nodes (default all) of the given run numbers (default all written runs). Returns a
+            dictionary of run numbers and dictionaries of node names and numpy arrays. Each needed column is
+            decompressed once per shard"""
+        if runs == None:
+            runs = [run["run"] for run in self.runs]
+        if nodes == None:
+            nodes = self.nodes
+        shard_runs = {}
+        for run_number in runs:
+            run = self.runs[run_number]
+            shard_runs.setdefault(run["shard"],[]).append(run)
+
+        results = {}
+        for shard_number, shard_run_list in sorted(shard_runs.items()):
+            shard = self.open_shard(shard_number)
+            for run in shard_run_list:
+                results[run["run"]] = {}
+            for node in nodes:
+                if node not in shard.files:
+                    continue
+                column = shard[node]
+                for run in shard_run_list:
+                    results[run["run"]][node] = column[run["offset"]:run["offset"]+run["length"]]
+        return(results)
+
+    def load_measurement(self,name,runs=None,step=0):
+        """Returns a numpy array of the named .meas result of the given step for the given run numbers (default all
+            written runs), straight from the index without opening any shards. Missing or failed results give nan"""
+        if runs == None:
+            runs = [run["run"] for run in self.runs]
+        values = numpy.full(len(runs),numpy.nan)
+        for run_index, run_number in enumerate(runs):
+            run_values = self.runs[run_number].get("measurements",{}).get(name.lower(),[])
+            if step < len(run_values) and run_values[step] != None:
+                values[run_index] = run_values[step]
+        return(values)
+
+    def load_node(self,node,runs=None):
+        """Loads one node for the given run numbers (default all written runs). Returns a list of numpy arrays in
+            the order of the runs"""
+        if runs == None:
+            runs = [run["run"] for run in self.runs]
+        results = self.load(runs,[node])
+        return([results[run_number].get(node) for run_number in runs])
+#----------------------------------------END Sweep Store Class----------------------------------------#}}}
+
+#----------------------------------------JSON Parameters----------------------------------------#{{{1
+def json_parameters(parameters):
+    """Returns a copy of the variable value dictionary that can be written to json, values that aren't json
+        numbers or strings are stored as strings"""
+    json_dictionary = {}
+    for variable, value in parameters.items():
+        if isinstance(value,(int,float,str)) or value == None:
+            json_dictionary[variable] = value
+        else:
+            json_dictionary[variable] = str(value)
+    return(json_dictionary)
+#----------------------------------------END JSON Parameters----------------------------------------#}}}
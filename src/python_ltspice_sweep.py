@@ -0,0 +1,140 @@
+#!/usr/bin/python
+# Python Code for running parameter sweeps of a netlist in parallel. Each sweep point gets its own working
+# netlist file so the LTSpice runs don't overwrite each other's .net/.log/.raw files
+import os
+import itertools
+from python_ltspice_tools import remove_path_from_name, log_values_class
+from python_ltspice_shared import shared_raw_values_class, shared_result_runner_class
+from python_ltspice_shared import make_shared_directory, remove_shared_directory
+from python_ltspice_lazy import lazy_import
+
+concurrent = lazy_import("concurrent.futures",globals())
+
+#----------------------------------------Parameter Grid----------------------------------------#{{{1
+def parameter_grid(variable_values_dictionary):
+    """Expands a dictionary of variables and lists of values, ie {"Rload0":["1k","2k"],"Rload1":["1k","5k"]},
+        into a list of variable value dictionaries, one for every combination of the values"""
+    variables = list(variable_values_dictionary.keys())
+    value_lists = [variable_values_dictionary[variable] for variable in variables]
+    grid = []
+    for values in itertools.product(*value_lists):
+        grid.append(dict(zip(variables,values)))
+    return(grid)
+#----------------------------------------END Parameter Grid----------------------------------------#}}}
+
+#----------------------------------------Sweep Point Filename----------------------------------------#{{{1
+def sweep_point_filename(netlist,index,working_directory=None):
+    """Returns the full filename of the working netlist for the given sweep point index. Defaults to the
+        directory of the netlist since LTspice has to be able to find it"""
+    if working_directory == None:
+        working_directory = netlist.linux_directory
+    base_name = remove_path_from_name(netlist.linux_filename).split(".net")[0]
+    point_filename = os.path.join(working_directory,"{}_sweep_{}.net".format(base_name,index))
+    return(point_filename)
+#----------------------------------------END Sweep Point Filename----------------------------------------#}}}
+
+#----------------------------------------Sweep Result Class----------------------------------------#{{{1
+class sweep_result_class:
+    """Container class for the result of one sweep point. Holds the point index, the variable value dictionary,
+        the raw_values_class of the run, the log_values_class of its .log and the exception if the run failed.
+        Runs made with run_sweep_point_measurements only have the log_values, raw_values is None.
+        Results sent through shared memory (see python_ltspice_shared) are attached here"""
+    def __init__(self,index,parameters,raw_values=None,exception=None):
+        self.index = index
+        self.parameters = parameters
+        if isinstance(raw_values,shared_raw_values_class):
+            raw_values = raw_values.attach()
+        if isinstance(raw_values,log_values_class):
+            self.raw_values = None
+            self.log_values = raw_values
+        else:
+            self.raw_values = raw_values
+            self.log_values = getattr(raw_values,"log_values",None)
+        self.exception = exception
+
+    def __repr__(self):
+        if self.exception != None:
+            return("{}: {} -> {}".format(self.index,self.parameters,self.exception))
+        if self.raw_values == None:
+            return("{}: {} -> {}".format(self.index,self.parameters,self.log_values))
+        return("{}: {} -> {}".format(self.index,self.parameters,self.raw_values))
+    def __str__(self):
+        return(self.__repr__())
+#----------------------------------------END Sweep Result Class----------------------------------------#}}}
+
+#----------------------------------------Run Sweep Point----------------------------------------#{{{1
+def run_sweep_point(point_netlist):
+    """Runs a single sweep point netlist in a worker process and returns its raw_values_class.
+        Errors in the .log are raised rather than exiting the worker"""
+    raw_values = point_netlist.run_netlist(raise_errors=True)
+    return(raw_values)
+
+def run_sweep_point_measurements(point_netlist):
+    """Runs a single sweep point netlist in a worker process and returns only the log_values_class of its .log, so
+        the .meas results come back without the .raw being read or sent. Use as run_sweep's run_function"""
+    log_values = point_netlist.run_netlist(raise_errors=True,read_raw=False)
+    return(log_values)
+
+class sweep_point_runner_class:
+    """A picklable run_function for run_sweep and the sweep workers that runs each point with the given
+        simulator_class, returning its raw_values_class, or only its log_values_class if read_raw is False"""
+    def __init__(self,simulator=None,read_raw=True):
+        self.simulator = simulator
+        self.read_raw = read_raw
+
+    def __repr__(self):
+        return("sweep point runner: {}, read_raw={}".format(self.simulator,self.read_raw))
+    def __str__(self):
+        return(self.__repr__())
+
+    def __call__(self,point_netlist):
+        return(point_netlist.run_netlist(raise_errors=True,simulator=self.simulator,read_raw=self.read_raw))
+#----------------------------------------END Run Sweep Point----------------------------------------#}}}
+
+#----------------------------------------Run Sweep----------------------------------------#{{{1
+def run_sweep(netlist,parameter_points,max_workers=None,working_directory=None,run_function=run_sweep_point,
+              shared_results=False):
+    """Runs the netlist once for every variable value dictionary in parameter_points (a list of dictionaries or a
+        grid dictionary of lists, see parameter_grid) using a pool of at most max_workers processes.
+        Yields a sweep_result_class for each point as it finishes, not in the order given. Only a couple of points
+        per worker are rendered and queued at a time so huge sweeps don't sit in memory.
+        With shared_results True the traces come back through shared memory instead of being pickled, and are
+        read only views (see python_ltspice_shared)"""
+    if isinstance(parameter_points,dict):
+        parameter_points = parameter_grid(parameter_points)
+    if max_workers == None:
+        max_workers = os.cpu_count() or 1
+
+    template = netlist.compile_template()
+    point_iterator = enumerate(parameter_points)
+    running = {}
+    shared_directory = None
+    if shared_results == True:
+        shared_directory = make_shared_directory()
+        run_function = shared_result_runner_class(run_function,shared_directory)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                #top up the queue of running points
+                for index, parameters in point_iterator:
+                    point_filename = sweep_point_filename(netlist,index,working_directory)
+                    point_netlist = template.make_netlist(parameters,new_filename=point_filename)
+                    future = executor.submit(run_function,point_netlist)
+                    running[future] = (index,parameters)
+                    if len(running) >= 2*max_workers:
+                        break
+                if len(running) == 0:
+                    break
+
+                finished, pending = concurrent.futures.wait(running,return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    index, parameters = running.pop(future)
+                    try:
+                        result = sweep_result_class(index,parameters,raw_values=future.result())
+                    except Exception as exception:
+                        result = sweep_result_class(index,parameters,exception=exception)
+                    yield(result)
+    finally:
+        if shared_directory != None:
+            remove_shared_directory(shared_directory)
+#----------------------------------------END Run Sweep----------------------------------------#}}}
@@ -5,6 +5,20 @@ import re
 import os
 import sys
 import copy
+import mmap
+import time
+import fnmatch
+import hashlib
+import shutil
+import threading
+import collections.abc
+from python_ltspice_instrument import instrumentation
+from python_ltspice_lazy import lazy_import
+
+#loaded on first use so importing this module (ie in every sweep worker) stays cheap
+numpy = lazy_import("numpy",globals())
+asyncio = lazy_import("asyncio",globals())
+subprocess = lazy_import("subprocess",globals())
 
 #----------------------------------------Remove Path from Name----------------------------------------#{{{1
 def remove_path_from_name(full_filename):
@@ -15,11 +29,13 @@ def remove_path_from_name(full_filename):
 
 #----------------------------------------Parameter Statement Class----------------------------------------#{{{1
 class parameter_statement_class:
-    """A container class for carrying around parameter statement info"""
-    def __init__(self,variable,value,line_number=None):
+    """A container class for carrying around parameter statement info. span is the (start,end) of the value
+        in the netlist line when it's known"""
+    def __init__(self,variable,value,line_number=None,span=None):
         self.variable = variable
         self.value = str(value)
         self.line_number = line_number
+        self.span = span
     def __repr__(self):
         return("{}={}".format(self.variable,self.value))
     def __str__(self):
@@ -27,11 +43,11 @@ class parameter_statement_class:
 #----------------------------------------END Parameter Statement Class----------------------------------------#}}}
 
 #----------------------------------------Parameter Check----------------------------------------#{{{1
+parameter_check_regex = re.compile(r"\S+ *= *\S+",re.IGNORECASE)
+
 def parameter_check(line):
     """finds the parameter and value for a given line and parameter"""
-    regex_string = "\S+ *= *\S+"
-    param_regex = re.compile(regex_string,re.IGNORECASE)
-    param_find = param_regex.findall(line)
+    param_find = parameter_check_regex.findall(line)
     if param_find != []:
         return_list = []
         for a_param in param_find:
@@ -79,9 +95,202 @@ def create_local_log_file(log_filename,log_lines):
     file = open(new_log_filename,"w")
     for line in log_lines:
         file.write(line+"\n")
+    file.close()
     return(new_log_filename)
 #----------------------------------------END Create Local Lof File----------------------------------------#}}}
 
+#----------------------------------------Read Log File----------------------------------------#{{{1
+@instrumentation.timed("read_log")
+def read_log_file(log_filename):
+    """Reads a .log file, written as plain text or UTF-16LE depending on the LTspice version. Returns the list of
+        lines, without endline characters, and the list of error lines"""
+    if not os.path.exists(log_filename):
+        return([],["No .log file written: {}".format(log_filename)])
+    file = open(log_filename,"rb")
+    log_bytes = file.read()
+    file.close()
+    if log_bytes[1:2] == b"\x00":
+        log_text = log_bytes.decode("utf-16-le",errors="replace")
+    else:
+        log_text = log_bytes.decode("latin-1")
+    log_lines = [line.rstrip() for line in log_text.split("\n")]
+    errors = [line.strip() for line in log_lines if "Error" in line]
+    instrumentation.count("log_bytes_read",len(log_bytes))
+    elapsed_time = find_log_elapsed_time(log_lines)
+    if elapsed_time != None:
+        instrumentation.count("log_elapsed_time",elapsed_time)
+    return(log_lines,errors)
+
+def find_log_elapsed_time(log_lines):
+    """Returns the simulator's own "Total elapsed time" in seconds from the .log lines, or None if it isn't there"""
+    for line in reversed(log_lines):
+        if line.startswith("Total elapsed time:"):
+            try:
+                return(float(line.split(":",1)[1].split()[0]))
+            except (IndexError,ValueError):
+                return(None)
+    return(None)
+#----------------------------------------END Read Log File----------------------------------------#}}}
+
+#----------------------------------------Log Values Class----------------------------------------#{{{1
+class log_values_class:
+    """Container class for what LTspice reports in a .log file, read by parse_log_lines. Holds
+        measurements: dictionary of .meas names and numpy arrays of their values, one per step (nan where it failed)
+        measurement_details: dictionary of .meas names and lists, one per step, of dictionaries of what else was
+            reported ("expression", "at", "from", "to", "when" for the condition's value of a WHEN measurement and,
+            for values that aren't numbers, "text")
+        failed_measurements: names of the measurements LTspice couldn't evaluate
+        steps: list of variable value dictionaries, one per .step line
+        elapsed_time: the "Total elapsed time" in seconds, or None
+        statistics: dictionary of the solver statistics (totiter, traniter, accept, rejected, method, ...)
+        convergence: the lines about how the operating point or time steps converged (Gmin stepping, ...)
+        warnings, errors: the warning and error lines"""
+    def __init__(self):
+        self.circuit = None
+        self.measurements = {}
+        self.measurement_details = {}
+        self.failed_measurements = []
+        self.steps = []
+        self.elapsed_time = None
+        self.statistics = {}
+        self.convergence = []
+        self.warnings = []
+        self.errors = []
+
+    def __repr__(self):
+        return("log: {} measurements, {} steps, {} s".format(len(self.measurements),max(len(self.steps),1),
+                                                           self.elapsed_time))
+    def __str__(self):
+        return(self.__repr__())
+
+    def measurement(self,name,step=0):
+        """Returns the value of the .meas result as a float, for the given step (counting from 0) of stepped runs.
+            Names are matched without case like LTspice does"""
+        return(float(self.measurements[name.lower()][step]))
+
+    def add_measurement(self,name,value,details):
+        name = name.lower()
+        self.measurements[name] = numpy.append(self.measurements.get(name,numpy.zeros(0)),value)
+        self.measurement_details.setdefault(name,[]).append(details)
+#----------------------------------------END Log Values Class----------------------------------------#}}}
+
+#----------------------------------------Parse Log Lines----------------------------------------#{{{1
+measurement_regex = re.compile(r"^(\w+):\s*(.*?)=(\S+)(.*)$")
+measurement_value_regex = re.compile(r"^(\w+)=(\S+)(.*)$")
+measurement_failed_regex = re.compile(r"^Measurement \"?(\w+)\"? FAIL",re.IGNORECASE)
+convergence_words = ("iteration","stepping","timestep","time step","singular","pseudo-transient","convergence")
+statistic_names = ("tnom","temp","method","totiter","traniter","tranpoints","accept","rejected","matrix size",
+                   "fillins","solver","thread vector","avgdcpts")
+
+def log_number(text):
+    """Returns the text as a float, or None if it isn't a number"""
+    try:
+        return(float(text))
+    except ValueError:
+        return(None)
+
+def measurement_qualifiers(text):
+    """Returns the dictionary of the AT/FROM/TO values trailing a measurement result"""
+    qualifiers = {}
+    words = text.split()
+    for word_number in range(len(words)-1):
+        keyword = words[word_number].lower()
+        if keyword in ("at","from","to"):
+            qualifiers[keyword] = log_number(words[word_number+1])
+    return(qualifiers)
+
+def parse_log_lines(log_lines):
+    """Reads the .meas results, .step values, solver statistics, convergence notes, timing, warnings and errors out
+        of the lines of a .log file and returns a log_values_class. Stepped measurements are reported by LTspice as
+        a table after a "Measurement: name" line, one row per step, the value in the second column"""
+    log_values = log_values_class()
+    table_name = None
+    for line in log_lines:
+        stripped_line = line.strip()
+        if table_name != None:
+            #rows of a stepped measurement table until the next blank line
+            if stripped_line == "":
+                table_name = None
+                continue
+            columns = stripped_line.split("\t") if "\t" in stripped_line else stripped_line.split()
+            if columns[0].lower() == "step":
+                table_header = columns
+                continue
+            value = log_number(columns[1]) if len(columns) > 1 else None
+            details = {"expression":table_header[1] if len(table_header) > 1 else None}
+            for header, column in zip(table_header[2:],columns[2:]):
+                details[header.lower()] = log_number(column)
+            if value == None:
+                details["text"] = columns[1] if len(columns) > 1 else ""
+                value = numpy.nan
+            log_values.add_measurement(table_name,value,details)
+            continue
+        if stripped_line == "":
+            continue
+
+        if stripped_line.startswith("Circuit:"):
+            log_values.circuit = stripped_line.split(":",1)[1].strip()
+        elif stripped_line.startswith("Measurement:"):
+            table_name = stripped_line.split(":",1)[1].strip()
+            table_header = []
+        elif stripped_line.startswith(".step"):
+            step = {}
+            for statement in stripped_line.split()[1:]:
+                if "=" in statement:
+                    variable, value = statement.split("=",1)
+                    step[variable] = value
+            log_values.steps.append(step)
+        elif stripped_line.startswith("Total elapsed time:"):
+            log_values.elapsed_time = log_number(stripped_line.split(":",1)[1].split()[0])
+        elif "Error" in stripped_line:
+            log_values.errors.append(stripped_line)
+        elif stripped_line.lower().startswith("warning"):
+            log_values.warnings.append(stripped_line)
+        elif measurement_failed_regex.match(stripped_line):
+            log_values.failed_measurements.append(measurement_failed_regex.match(stripped_line).group(1).lower())
+        elif " = " in stripped_line and stripped_line.split(" = ")[0].lower() in statistic_names:
+            statistic, value = stripped_line.split(" = ",1)
+            value = value.strip()
+            if re.match(r"^-?\d+$",value):
+                value = int(value)
+            elif log_number(value) != None:
+                value = log_number(value)
+            log_values.statistics[statistic.lower()] = value
+        elif measurement_regex.match(stripped_line) or measurement_value_regex.match(stripped_line):
+            #"name: expression=value AT x" or "name: expression=value FROM a TO b" or "name=value FROM a TO b"
+            match = measurement_regex.match(stripped_line)
+            if match != None:
+                name, expression, value_text, rest = match.groups()
+            else:
+                name, value_text, rest = measurement_value_regex.match(stripped_line).groups()
+                expression = None
+            details = measurement_qualifiers(rest)
+            details["expression"] = expression
+            value = log_number(value_text)
+            #a WHEN measurement gives the condition's value and then, in capitals, the time it was met which is its
+            #result ("tdelay: v(out)=2.5 AT 1.234e-05"), while FIND ... AT gives its result then a lower case "at"
+            if "AT" in rest.split() and details.get("at") != None:
+                details["when"] = value
+                value = details["at"]
+            if value == None:
+                details["text"] = value_text
+                value = numpy.nan
+            log_values.add_measurement(name,value,details)
+        elif any([word in stripped_line.lower() for word in convergence_words]):
+            log_values.convergence.append(stripped_line)
+    for name in log_values.failed_measurements:
+        if name not in log_values.measurements:
+            log_values.measurements[name] = numpy.array([numpy.nan])
+    return(log_values)
+
+def read_log_values(log_filename):
+    """Reads and parses a .log file, returning a log_values_class. A missing .log gives one holding an error"""
+    log_lines, errors = read_log_file(log_filename)
+    log_values = parse_log_lines(log_lines)
+    log_values.errors = errors
+    return(log_values)
+#----------------------------------------END Parse Log Lines----------------------------------------#}}}
+
 #----------------------------------------Parameter Exception Class----------------------------------------#{{{1
 class ParameterException(Exception):
     """An exception class for when the given parameter is not found in the file"""
@@ -95,6 +304,28 @@ class ParameterException(Exception):
         return(error_string)            
 #----------------------------------------END Parameter Exception Class----------------------------------------#}}}
 
+#----------------------------------------Simulation Exception Class----------------------------------------#{{{1
+class SimulationException(Exception):
+    """An exception class for when LTspice reports an error in the .log file of a netlist, or doesn't finish.
+        The error lines from the .log are kept in errors, and everything else the .log reported (warnings,
+        convergence notes, measurements made before the failure) in log_values, a log_values_class, when it was read"""
+    def __init__(self,netlist_name,log_filename,errors=[],reason=None,log_values=None):
+        self.netlist_name = netlist_name
+        self.log_filename = log_filename
+        self.errors = list(errors)
+        self.reason = reason
+        self.log_values = log_values
+    def __repr__(self):
+        error_string = "SimulationError: LTspice failed to run {}, see {}".format(self.netlist_name,self.log_filename)
+        if self.reason != None:
+            error_string += ": {}".format(self.reason)
+        elif self.errors != []:
+            error_string += ": {}".format("; ".join(self.errors))
+        return(error_string)
+    def __str__(self):
+        return(self.__repr__())
+#----------------------------------------END Simulation Exception Class----------------------------------------#}}}
+
 #----------------------------------------Simulation Command Class----------------------------------------#{{{1
 class simulation_command_class:
     """Defines the class of simulation command. Includes the command type, parameters needed (given as a string),
@@ -155,12 +386,13 @@ class simulation_commands_class(dict):
             finds it. Else returns False."""
         line = line.rstrip()
         found_command = None
-        for command_type, simulation_command in self.iteritems():
-            
-            if len(line) >= 1 and line[0] != ";":
-                if simulation_command.base_command_name in line:
-                    found_command = self.make_command(simulation_command.command_type)
-                    break
+        words = line.split()
+        if words == [] or words[0][0] != ".":
+            return(found_command)
+        for command_type, simulation_command in self.items():
+            if words[0].lower() == "." + simulation_command.base_command_name:
+                found_command = self.make_command(simulation_command.command_type)
+                break
         if found_command != None:
             line = line.split(" ")
             parameters = ""
@@ -173,6 +405,254 @@ class simulation_commands_class(dict):
 simulation_commands = simulation_commands_class()
 #----------------------------------------END Simulation Commands Dictionary----------------------------------------#}}}
 
+#----------------------------------------Netlist Index Class----------------------------------------#{{{1
+class netlist_index_class:
+    """Container class for what index_netlist_lines finds in a netlist: parameter statements by variable, element
+        line numbers by element name, the variables on each line, the (line number, command, filename) of each
+        .include/.lib, the (line number, command) of every dot command, the kind of every line and the
+        simulation command"""
+    def __init__(self):
+        self.parameters = {}
+        self.elements = {}
+        self.line_parameters = {}
+        self.includes = []
+        self.commands = []
+        self.line_kinds = []
+        self.simulation_command = None
+
+    def __repr__(self):
+        return("{} lines, {} parameters, {} elements".format(len(self.line_kinds),len(self.parameters),
+                                                             len(self.elements)))
+    def __str__(self):
+        return(self.__repr__())
+#----------------------------------------END Netlist Index Class----------------------------------------#}}}
+
+#----------------------------------------Index Netlist Lines----------------------------------------#{{{1
+parameter_regex = re.compile(r"([^\s=+][^\s=]*) *= *(\S+)")
+include_commands = ("include","inc","lib")
+
+def index_netlist_lines(lines):
+    """Reads through the netlist lines once and returns a netlist_index_class. Each line is a "blank", "comment"
+        (* or ;), "continuation" (+, the parameters on it are indexed like any other line's), "command" (.something)
+        or "element" line. Inline ; comments are ignored. Every name=value outside a comment is indexed as a parameter
+        statement with the span of its value, the last one found winning like parameter_check"""
+    netlist_index = netlist_index_class()
+    for line_number, line in enumerate(lines):
+        stripped_line = line.lstrip()
+        if stripped_line == "":
+            netlist_index.line_kinds.append("blank")
+            continue
+        first_character = stripped_line[0]
+        if first_character == "*" or first_character == ";":
+            netlist_index.line_kinds.append("comment")
+            continue
+        code = line.split(";",1)[0]
+        
+        if first_character == "+":
+            netlist_index.line_kinds.append("continuation")
+        elif first_character == ".":
+            netlist_index.line_kinds.append("command")
+            words = code.split()
+            command = words[0][1:].lower()
+            netlist_index.commands.append((line_number,command))
+            if command in include_commands and len(words) > 1:
+                include_name = code.split(None,1)[1].strip()
+                if include_name.startswith("\""):
+                    include_name = include_name[1:].split("\"")[0]
+                elif command == "lib":
+                    include_name = include_name.split()[0] #.lib filename [entry]
+                netlist_index.includes.append((line_number,command,include_name))
+            else:
+                simulation_command = simulation_commands.check_line_for_command(code)
+                if simulation_command != None:
+                    simulation_command.netlist_line_number = line_number
+                    netlist_index.simulation_command = simulation_command
+        else:
+            netlist_index.line_kinds.append("element")
+            netlist_index.elements[code.split()[0]] = line_number
+        
+        if "=" in code:
+            line_variables = []
+            for param_find in parameter_regex.finditer(code):
+                variable = param_find.group(1)
+                parameter_statement = parameter_statement_class(variable,param_find.group(2),line_number,
+                                                                param_find.span(2))
+                netlist_index.parameters[variable] = parameter_statement
+                line_variables.append(variable)
+            netlist_index.line_parameters[line_number] = line_variables
+    return(netlist_index)
+#----------------------------------------END Index Netlist Lines----------------------------------------#}}}
+
+#----------------------------------------Working File State Class----------------------------------------#{{{1
+class working_file_state_class:
+    """Container class for what was last written to a working netlist file and what running it gave. When the
+        lines came from change_parameters/templates of one read netlist (source_lines) only the edited lines are
+        kept (dirty_values), otherwise the sha256 of the whole text. line_offsets are the byte offsets of the lines
+        in the file and file_stat/raw_stat the (modification time, size) of the .net and .raw files"""
+    def __init__(self):
+        self.source_lines = None
+        self.dirty_values = None
+        self.text_hash = None
+        self.line_offsets = None
+        self.file_stat = None
+        self.raw_values = None
+        self.raw_stat = None
+
+working_file_states = {}
+
+def file_stat(filename):
+    """Returns the (modification time, size) of the file, or None if it doesn't exist"""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return(None)
+    return((stat.st_mtime_ns,stat.st_size))
+#----------------------------------------END Working File State Class----------------------------------------#}}}
+
+#----------------------------------------Included File Class----------------------------------------#{{{1
+class included_file_class:
+    """Container class for a parsed .include/.lib file: its lines, netlist_index_class, sha256 of its contents and
+        the modification time and size it was read at"""
+    def __init__(self,filename,modification_time,size,lines,netlist_index,content_hash):
+        self.filename = filename
+        self.modification_time = modification_time
+        self.size = size
+        self.lines = lines
+        self.netlist_index = netlist_index
+        self.content_hash = content_hash
+    def __repr__(self):
+        return(self.filename)
+    def __str__(self):
+        return(self.filename)
+
+included_file_cache = {}
+
+def read_included_file(filename):
+    """Returns the included_file_class of the file, only reading and parsing it the first time and again when its
+        modification time or size changes. Parsed files are shared by every netlist in the process"""
+    file_stat = os.stat(filename)
+    included_file = included_file_cache.get(filename)
+    if included_file != None and included_file.modification_time == file_stat.st_mtime_ns and \
+            included_file.size == file_stat.st_size:
+        return(included_file)
+    file = open(filename,"rb")
+    file_bytes = file.read()
+    file.close()
+    lines = [line.rstrip() for line in file_bytes.decode("latin-1").split("\n")]
+    included_file = included_file_class(filename,file_stat.st_mtime_ns,file_stat.st_size,lines,
+                                        index_netlist_lines(lines),hashlib.sha256(file_bytes).hexdigest())
+    included_file_cache[filename] = included_file
+    return(included_file)
+#----------------------------------------END Included File Class----------------------------------------#}}}
+
+#----------------------------------------Find Include Filename----------------------------------------#{{{1
+def find_include_filename(include_name,search_directories,c_drive=None):
+    """Finds the linux filename of an .include/.lib name. Windows paths (C:\\...) are looked up under the wine
+        c_drive, relative names in each of the search directories in turn. Returns None if it can't be found"""
+    include_name = include_name.replace("\\","/")
+    if re.match("^[A-Za-z]:/",include_name) != None:
+        if c_drive == None:
+            c_drive = os.environ.get("C_DRIVE",os.path.expanduser("~/.wine/drive_c"))
+        include_name = os.path.join(c_drive,include_name[3:])
+    if os.path.isabs(include_name):
+        if os.path.isfile(include_name):
+            return(include_name)
+        return(None)
+    for directory in search_directories:
+        full_name = os.path.join(directory,include_name)
+        if os.path.isfile(full_name):
+            return(os.path.normpath(full_name))
+    return(None)
+#----------------------------------------END Find Include Filename----------------------------------------#}}}
+
+#----------------------------------------Simulator Class----------------------------------------#{{{1
+class simulator_class:
+    """Launches LTspice on netlists. Resolves wine, the LTspiceIV directory and the environment once up front instead
+        of going through run_netlist.sh, which sources ~/.bashrc and looks everything up again on every run.
+        Keeps a count of runs and the time spent in the simulator separately from the wine startup time"""
+    def __init__(self,ltspice_directory=None,wine="wine",executable="scad3.exe"):
+        if ltspice_directory == None:
+            c_drive = os.environ.get("C_DRIVE",os.path.expanduser("~/.wine/drive_c"))
+            ltspice_directory = os.path.join(c_drive,"Program Files","LTC","LTspiceIV")
+        self.ltspice_directory = ltspice_directory
+        self.wine = shutil.which(wine) or wine
+        self.wineserver = shutil.which("wineserver",path=os.path.dirname(self.wine) or None) or "wineserver"
+        self.executable = executable
+        self.environment = dict(os.environ)
+        self.environment.setdefault("WINEDEBUG","-all")
+        self.startup_time = 0.0
+        self.run_count = 0
+        self.run_time = 0.0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return("{} {}: {} runs, {:.2f} s simulating, {:.2f} s starting up".format(self.wine,self.executable,
+                                                                             self.run_count,self.run_time,self.startup_time))
+    def __str__(self):
+        return(self.__repr__())
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return(state)
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def command(self,netlist):
+        """Returns the command list for running the netlist, run from the LTspiceIV directory"""
+        return([self.wine,self.executable,"-b","-run",netlist.wine_filename])
+
+    @instrumentation.timed("wine_startup")
+    def start(self):
+        """Starts a persistent wineserver and warms up wine so later runs don't pay for it. Returns the startup time"""
+        start_time = time.time()
+        subprocess.call([self.wineserver,"-p"],env=self.environment,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+        subprocess.call([self.wine,"cmd","/c","exit"],env=self.environment,cwd=self.ltspice_directory,
+                        stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+        self.startup_time += time.time() - start_time
+        return(self.startup_time)
+
+    def stop(self):
+        """Shuts down the wineserver started by start"""
+        subprocess.call([self.wineserver,"-k"],env=self.environment,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+
+    @instrumentation.timed("simulate")
+    def run(self,netlist):
+        """Runs LTspice on the netlist (which has to be written already) and returns the time it took. The CPU time
+            of the simulator process is added to the simulator_cpu_time counter"""
+        start_time = time.time()
+        process = subprocess.Popen(self.command(netlist),env=self.environment,cwd=self.ltspice_directory,
+                                   stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+        if hasattr(os,"wait4"):
+            #wait4 gives the resource usage of just this child, even with other runs going in other threads
+            process_id, status, usage = os.wait4(process.pid,0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            instrumentation.count("simulator_cpu_time",usage.ru_utime+usage.ru_stime)
+        else:
+            process.wait()
+        run_time = time.time() - start_time
+        self.record_run(run_time)
+        return(run_time)
+
+    def record_run(self,run_time):
+        """Adds a run that took run_time seconds to the run count and simulation time"""
+        with self.lock:
+            self.run_count += 1
+            self.run_time += run_time
+#----------------------------------------END Simulator Class----------------------------------------#}}}
+
+#----------------------------------------Kill Process----------------------------------------#{{{1
+async def kill_process(process):
+    """Kills an asyncio subprocess if it's still running and waits for it to exit"""
+    if process.returncode == None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        await process.wait()
+#----------------------------------------END Kill Process----------------------------------------#}}}
+
 #----------------------------------------Netlist Class----------------------------------------#{{{1
 class netlist_class:
     """A class for carrying around info about a netlist file.
@@ -180,6 +660,14 @@ class netlist_class:
         and changing parameters of the netlist."""
     def __init__(self,linux_filename):
         self.linux_filename = linux_filename
+        self.elements = {}
+        self.line_parameters = {}
+        self.includes = []
+        self.missing_includes = []
+        self.source_lines = ()
+        self.dirty_lines = None
+        self.selected_nodes = None
+        self.save_line = None
         
         if ".wine" in linux_filename:
             self.wine_filename = linux_filename.split("LTspiceIV/")[-1]
@@ -194,135 +682,483 @@ class netlist_class:
     def __str__(self):
         return(self.name)
 
+    @instrumentation.timed("read_file")
     def read_file(self):
         """Read the file's lines into a list, removing the endline characters, and placing it in the lines attribute. 
             Finds parameter statements and places them in parameter attributes. Reads the type of simulation being performed,
             if any."""
         
         file = open(self.linux_filename,"r")
-        lines = file.readlines()
-        
-        edited_lines = []
-        parameters = {}
-        line_counter = 0
-        for line in lines:
-            #remove trailing "\r\n" characters.
-            edited_line = line.rstrip()
-            edited_lines.append(edited_line)
-          
-            #check for a simulation command
-            command_check = simulation_commands.check_line_for_command(line)
-            if command_check != None:
-                self.simulation_command = command_check
-                self.simulation_command.netlist_line_number = line_counter
-            
-            #check for parameters
-            param_check = parameter_check(line)
-            if param_check != False:
-                for a_param in param_check:
-                    a_param.line_number = line_counter
-                    parameters[a_param.variable] = a_param
-            
-            line_counter += 1
-        
-        self.lines = edited_lines
-        self.parameters = parameters
+        instrumentation.count("netlist_bytes_read",os.fstat(file.fileno()).st_size)
+        #remove trailing "\r\n" characters.
+        edited_lines = [line.rstrip() for line in file]
         file.close()
+        instrumentation.count("netlist_lines_parsed",len(edited_lines))
+        self.index_lines(edited_lines)
+
+    def index_lines(self,lines):
+        """Makes the given lines the netlist's lines and indexes their parameter statements, elements, includes
+            and simulation command. The lines become the new baseline that edits are tracked against"""
+        netlist_index = index_netlist_lines(lines)
+        self.lines = lines
+        self.source_lines = tuple(lines)
+        self.dirty_lines = set()
+        self.parameters = netlist_index.parameters
+        self.elements = netlist_index.elements
+        self.line_parameters = netlist_index.line_parameters
+        self.includes = netlist_index.includes
+        if netlist_index.simulation_command != None:
+            self.simulation_command = netlist_index.simulation_command
+
+    def select_nodes(self,nodes,save=True):
+        """Only reads the given nodes (names like "out", "V(out)", "I(R1)" and/or patterns like "out*", see
+            select_variables) out of the .raw file of each run. If save is True and none of the nodes are patterns a
+            .save line for them is put in the netlist too (replacing any there), so LTspice only writes those. A
+            pattern could match nodes the .save would leave out, so then the netlist's own .save lines are left alone
+            and only one put in by an earlier select_nodes is removed. Give None to go back to reading everything"""
+        self.selected_nodes = nodes
+        if save == False:
+            return
+        if isinstance(nodes,str):
+            nodes = [nodes]
+        save_names = []
+        for node in nodes or []:
+            if any([character in node for character in "*?["]):
+                save_names = []
+                break
+            save_names.append(node if "(" in node else "V({})".format(node))
+        if save_names == []:
+            lines = [line for line in self.lines if line != self.save_line]
+            self.save_line = None
+        else:
+            lines = [line for line in self.lines if not line.lower().startswith(".save ")]
+            self.save_line = ".save {}".format(" ".join(save_names))
+            end_line_numbers = [line_number for line_number, line in enumerate(lines)
+                                if line.lower().split()[:1] in ([".backanno"],[".end"])]
+            insert_line_number = end_line_numbers[0] if end_line_numbers != [] else len(lines)
+            lines.insert(insert_line_number,self.save_line)
+        if lines != self.lines:
+            self.index_lines(lines)
 
     def change_single_param(self,a_variable,a_value):
         """Finds the given vairable in the netlist lines and replaces the current value with the given value.
             Returns the new lines of a new netlist with the value changed.
             Really only for internal use"""
         parameter_statment = self.parameters[a_variable]
-        new_lines = change_parameter_value(a_param=parameter_statment,new_value=str(a_value),current_lines=self.lines)
-        return(new_lines)
+        line_number = parameter_statment.line_number
+        span = parameter_statment.span
+        if span != None and self.lines[line_number][span[0]:span[1]] != parameter_statment.value:
+            #the line was edited directly so the span no longer points at the value
+            parameter_statment.span = None
+        if self.dirty_lines != None:
+            self.dirty_lines.add(line_number)
+        if parameter_statment.span == None:
+            new_lines = change_parameter_value(a_param=parameter_statment,new_value=str(a_value),current_lines=self.lines)
+            return(new_lines)
+        
+        #swap the value in by its span and move along the spans of the values after it on the line
+        value_start, value_end = parameter_statment.span
+        new_value = str(a_value)
+        line = self.lines[line_number]
+        self.lines[line_number] = line[:value_start] + new_value + line[value_end:]
+        shift = len(new_value) - (value_end - value_start)
+        parameter_statment.span = (value_start,value_start+len(new_value))
+        for variable in self.line_parameters.get(line_number,[]):
+            other_statement = self.parameters.get(variable)
+            if other_statement != None and other_statement.line_number == line_number and \
+                    other_statement.span != None and other_statement.span[0] > value_start:
+                other_statement.span = (other_statement.span[0]+shift,other_statement.span[1]+shift)
+        return(self.lines)
 
+    @instrumentation.timed("change_parameters")
     def change_parameters(self,variable_value_dictionary,new_filename=None):
         """Changes all the parameters of the netlist lines to the values given in the varaible_value_dictionary.
             Returns a new netlist object. Give the full path to the new linux filename if you don't want to use
             the default new filename."""
-        ##Create the new_netlist from the old and rename it's by appending "new" or the given filename
-        new_netlist = copy.deepcopy(self)
-        if new_filename == None:
-            new_netlist.name = "{}_new".format(self.name.split(".net")[0])+".net"
-            new_netlist.linux_filename = self.linux_directory + new_netlist.name
-            new_netlist.wine_filename = self.wine_directory + new_netlist.name
-        else:
-            new_netlist.linux_filename = new_filename
-            if ".wine" in new_filename:
-                self.wine_filename = new_filename.split("LTspiceIV/")[-1]
-            new_netlist.name = remove_path_from_name(new_filename)
-            new_netlist.linux_directory = new_filename.replace(self.name,"")
-            new_netlist.wine_directory = new_netlist.linux_directory.split("LTspiceIV/")[-1]
+        ##Create the new_netlist from the old and rename it's by appending "new" or the given filename.
+        ##Only the lines and parameter statements change, the element and include indexes are shared
+        new_netlist = copy.copy(self)
+        new_netlist.lines = list(self.lines)
+        if self.dirty_lines != None:
+            new_netlist.dirty_lines = set(self.dirty_lines)
+        new_netlist.simulation_command = copy.copy(self.simulation_command)
+        new_netlist.parameters = {}
+        for variable, parameter_statement in self.parameters.items():
+            new_netlist.parameters[variable] = copy.copy(parameter_statement)
+        new_netlist.set_filename(new_filename)
         
         ##Change the parameters and update the new parameter dictionary
-        new_parameters = self.parameters
-        for variable, value in variable_value_dictionary.iteritems():
+        for variable, value in variable_value_dictionary.items():
             try:
                 new_netlist.lines = new_netlist.change_single_param(variable,value)
             except KeyError as keyerror:
                 print(ParameterException(keyerror.args[0]))
                 sys.exit(0)
-            new_parameter_statement = parameter_statement_class(variable,value)
-            new_parameter_statement = new_parameters[variable]
-            new_parameter_statement.value = value
-            new_parameters[variable] = new_parameter_statement
-        new_netlist.parameters = new_parameters   
+            new_netlist.parameters[variable].value = str(value)
 
         return(new_netlist)
 
+    def set_filename(self,new_filename=None):
+        """Points the netlist at a new file. Defaults to the original name with "_new" appended, otherwise give the
+            full path to the new linux filename"""
+        if new_filename == None:
+            self.name = "{}_new".format(self.name.split(".net")[0])+".net"
+            self.linux_filename = self.linux_directory + self.name
+            self.wine_filename = self.wine_directory + self.name
+        else:
+            self.linux_filename = new_filename
+            if ".wine" in new_filename:
+                self.wine_filename = new_filename.split("LTspiceIV/")[-1]
+            self.name = remove_path_from_name(new_filename)
+            self.linux_directory = new_filename.replace(self.name,"")
+            self.wine_directory = self.linux_directory.split("LTspiceIV/")[-1]
+
+    def resolve_includes(self):
+        """Finds every file the netlist pulls in through .include/.lib, following the includes of included files
+            too. Returns the list of included_file_class objects (each file once, in the order found); names that
+            can't be found are put in the missing_includes attribute. Files are parsed once per process and
+            reparsed only when they change, see read_included_file"""
+        ltspice_directory = self.linux_directory.split("LTspiceIV/")[0] + "LTspiceIV/"
+        library_directories = [os.path.join(ltspice_directory,"lib","sub"),os.path.join(ltspice_directory,"lib","cmp")]
+        if "drive_c/" in self.linux_directory:
+            c_drive = self.linux_directory.split("drive_c/")[0] + "drive_c"
+        else:
+            c_drive = None
+        
+        included_files = []
+        self.missing_includes = []
+        found_filenames = set()
+        pending = [(self.linux_directory,include) for include in self.includes]
+        while pending != []:
+            directory, (line_number, command, include_name) = pending.pop(0)
+            search_directories = [directory,self.linux_directory] + library_directories
+            filename = find_include_filename(include_name,search_directories,c_drive)
+            if filename == None:
+                self.missing_includes.append(include_name)
+                continue
+            if filename in found_filenames:
+                continue
+            found_filenames.add(filename)
+            included_file = read_included_file(filename)
+            included_files.append(included_file)
+            pending += [(os.path.dirname(filename),include) for include in included_file.netlist_index.includes]
+        return(included_files)
+
+    def compile_template(self):
+        """Returns a netlist_template_class of this netlist for quickly rendering many parameter variants"""
+        return(netlist_template_class(self))
+
+    @instrumentation.timed("write_file")
     def write_file(self):
-        """Writes the lines to the netlist file"""
-        file = open(self.linux_filename,"w")
-        for line in self.lines:
-            file.write(line+"\n")
+        """Writes the lines to the netlist file. Returns False without writing if the file already holds these lines.
+            Lines edited through change_single_param, change_parameters or templates are tracked in dirty_lines, so
+            only those are compared, and if they kept their length they're patched into the file in place.
+            Lines edited directly (ie netlist.lines[2] = ...) are found by track_direct_edits and written too"""
+        state = working_file_states.get(self.linux_filename)
+        if state == None:
+            state = working_file_state_class()
+            working_file_states[self.linux_filename] = state
+        self.track_direct_edits()
+        changed_lines = self.find_changed_lines(state)
+        if changed_lines == []:
+            instrumentation.count("netlist_writes_skipped")
+            return(False)
+        state.raw_values = None
+        
+        tracked = self.dirty_lines != None and len(self.lines) == len(self.source_lines)
+        if changed_lines != None and tracked and state.line_offsets != None:
+            line_bytes = [(line_number,self.lines[line_number].encode("utf-8")) for line_number in changed_lines]
+            old_lengths = [state.line_offsets[line_number+1]-state.line_offsets[line_number]-1
+                           for line_number in changed_lines]
+            if [len(new_bytes) for line_number, new_bytes in line_bytes] == old_lengths:
+                file = open(self.linux_filename,"r+b")
+                for line_number, new_bytes in line_bytes:
+                    file.seek(state.line_offsets[line_number])
+                    file.write(new_bytes)
+                file.close()
+                instrumentation.count("netlist_bytes_written",sum([len(new_bytes) for number, new_bytes in line_bytes]))
+                state.dirty_values = dict([(line_number,self.lines[line_number]) for line_number in self.dirty_lines])
+                state.text_hash = None
+                state.file_stat = file_stat(self.linux_filename)
+                return(True)
+        
+        #rewrite the whole file
+        encoded_lines = [line.encode("utf-8") for line in self.lines]
+        file_bytes = b"\n".join(encoded_lines) + b"\n"
+        file = open(self.linux_filename,"wb")
+        file.write(file_bytes)
         file.close()
+        instrumentation.count("netlist_bytes_written",len(file_bytes))
+        state.line_offsets = numpy.concatenate(([0],numpy.cumsum([len(line)+1 for line in encoded_lines]))).tolist()
+        state.text_hash = hashlib.sha256(file_bytes).hexdigest()
+        if tracked:
+            state.source_lines = self.source_lines
+            state.dirty_values = dict([(line_number,self.lines[line_number]) for line_number in self.dirty_lines])
+        else:
+            state.source_lines = None
+            state.dirty_values = None
+        state.file_stat = file_stat(self.linux_filename)
+        return(True)
+
+    def track_direct_edits(self):
+        """Adds the lines that differ from the source lines without being in dirty_lines (edited by assigning to
+            lines rather than through change_single_param or a template) to dirty_lines. Untouched lines are the
+            same string objects as the source lines, so this is mostly identity checks. If lines were added or
+            removed dirty_lines can't describe the edit and is set to None so the whole text is compared"""
+        if self.dirty_lines == None:
+            return
+        if len(self.lines) != len(self.source_lines):
+            self.dirty_lines = None
+            return
+        for line_number, (line, source_line) in enumerate(zip(self.lines,self.source_lines)):
+            if line is not source_line and line != source_line:
+                self.dirty_lines.add(line_number)
+
+    def find_changed_lines(self,state):
+        """Returns the line numbers that differ from what was last written to the netlist file, [] if nothing
+            changed, or None if it can't tell which lines changed"""
+        if state.file_stat == None or state.file_stat != file_stat(self.linux_filename):
+            return(None)
+        if self.dirty_lines != None and state.source_lines is self.source_lines and state.dirty_values != None \
+                and len(self.lines) == len(self.source_lines):
+            changed_lines = []
+            for line_number in sorted(self.dirty_lines | set(state.dirty_values)):
+                if self.lines[line_number] != state.dirty_values.get(line_number,self.source_lines[line_number]):
+                    changed_lines.append(line_number)
+            return(changed_lines)
+        if state.text_hash != None:
+            text_hash = hashlib.sha256(("\n".join(self.lines)+"\n").encode("utf-8")).hexdigest()
+            if text_hash == state.text_hash:
+                return([])
+        return(None)
 
-    def run_netlist(self):
-        """Runs the given netlist assuming the netlist is in the LTspiveIV directory"""
-        self.write_file()
-        command = "run_netlist.sh {}".format(self.wine_filename)
-        os.system(command)
+    def reusable_raw_values(self):
+        """Returns the raw_values_class of the last run of this netlist file if the netlist and .raw file haven't
+            changed since and it read the same nodes, otherwise None"""
+        state = working_file_states.get(self.linux_filename)
+        if state == None or state.raw_values == None or state.raw_values.nodes != self.selected_nodes:
+            return(None)
+        if state.raw_stat != file_stat(self.linux_filename.replace(".net",".raw")):
+            return(None)
+        return(state.raw_values)
+
+    def remember_raw_values(self,raw_values):
+        """Keeps the raw_values_class of a run with the netlist file's state so an identical rerun can reuse it"""
+        state = working_file_states.get(self.linux_filename)
+        if state != None:
+            state.raw_values = raw_values
+            state.raw_stat = file_stat(self.linux_filename.replace(".net",".raw"))
+
+    def release_raw_file(self):
+        """Removes the .raw file of the last run before LTspice writes a new one. Binary traces are memory mapped
+            views of that file, and LTspice rewrites it in place, so without this earlier results would change under
+            their owners (or crash them if the new file is shorter). Removing the name leaves the old file alive for
+            as long as it's mapped and LTspice makes a new one"""
+        try:
+            os.remove(self.linux_filename.replace(".net",".raw"))
+        except FileNotFoundError:
+            pass
+
+    @instrumentation.timed("run_netlist")
+    def run_netlist(self,raise_errors=False,cache=None,simulator=None,force=False,read_raw=True):
+        """Runs the given netlist assuming the netlist is in the LTspiveIV directory. If raise_errors is True
+            an error in the .log raises a SimulationException instead of opening the log and exiting.
+            Give a simulation_cache_class (see python_ltspice_cache) as cache to reuse results of identical netlists.
+            Give a simulator_class to launch LTspice directly instead of through run_netlist.sh.
+            If the netlist file already held exactly these lines and was run, the last raw_values_class is returned
+            without running LTspice again, unless force is True (ie for Monte Carlo runs).
+            With read_raw False only the .log is read and its log_values_class is returned, for when the .meas
+            results are all that's needed"""
+        if cache != None:
+            raw_values = cache.run(self,raise_errors=raise_errors,simulator=simulator)
+            return(raw_values if read_raw == True else raw_values.log_values)
+        written = self.write_file()
+        if written == False and force == False and self.reusable_raw_values() != None:
+            instrumentation.count("runs_reused")
+            raw_values = self.reusable_raw_values()
+            return(raw_values if read_raw == True else raw_values.log_values)
+        self.release_raw_file()
+        if simulator != None:
+            simulator.run(self)
+        else:
+            command = "run_netlist.sh {}".format(self.wine_filename)
+            with instrumentation.stage("simulate",target=self.name):
+                os.system(command)
         
         #Read in log file and check for errors
         log_filename = self.linux_filename.replace(".net",".log")
-        file = open(log_filename,"r")
-        log_lines = file.readlines()
-        
-        edited_lines = []
-        error = False
-        for line in log_lines:
-            edited_line = line.rstrip()
-            edited_lines.append(edited_line)
-            if "Error" in line:
-                error = True
-        
-        log_lines = edited_lines
+        log_lines, errors = read_log_file(log_filename)
         local_log_filename = create_local_log_file(log_filename,log_lines)
         
-        if error == True:
+        if errors != [] and raise_errors == True:
+            raise SimulationException(self.name,local_log_filename,errors,log_values=parse_log_lines(log_lines))
+        elif errors != []:
             command = "gedit {}&".format(local_log_filename)
             os.system(command)
             sys.exit(0)
+        elif read_raw == False:
+            return(parse_log_lines(log_lines))
         
         else: #if no errors make raw_values object
             raw_values = raw_values_class(self.linux_filename,log_filename=local_log_filename,log_lines=log_lines,
-                                            simulation_command=self.simulation_command)        
+                                            simulation_command=self.simulation_command,nodes=self.selected_nodes)
+            self.remember_raw_values(raw_values)
             return(raw_values)
+
+    async def run_netlist_async(self,timeout=None,simulator=None,force=False,read_raw=True):
+        """Coroutine version of run_netlist for use in an asyncio event loop. Launches LTspice as an asyncio
+            subprocess through the simulator_class (a default one if not given), so many runs can be in flight at
+            once. If the run takes longer than timeout seconds, or the coroutine is cancelled, the simulator is
+            killed. Errors in the .log raise a SimulationException holding the error lines.
+            With read_raw False only the log_values_class of the .log is returned"""
+        if simulator == None:
+            simulator = simulator_class()
+        log_filename = self.linux_filename.replace(".net",".log")
+        written = self.write_file()
+        if written == False and force == False and self.reusable_raw_values() != None:
+            instrumentation.count("runs_reused")
+            raw_values = self.reusable_raw_values()
+            return(raw_values if read_raw == True else raw_values.log_values)
+        
+        self.release_raw_file()
+        start_time = time.time()
+        start_perf_time = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(*simulator.command(self),cwd=simulator.ltspice_directory,
+                                                       env=simulator.environment,stdout=subprocess.DEVNULL,
+                                                       stderr=subprocess.DEVNULL)
+        try:
+            await asyncio.wait_for(process.wait(),timeout)
+        except asyncio.TimeoutError:
+            await kill_process(process)
+            raise SimulationException(self.name,log_filename,reason="timed out after {} s".format(timeout))
+        except asyncio.CancelledError:
+            await kill_process(process)
+            raise
+        simulator.record_run(time.time()-start_time)
+        #the event loop thread's CPU time isn't the simulator's so only the wall time is recorded
+        instrumentation.record_stage("simulate",start_perf_time,time.perf_counter()-start_perf_time,0.0,
+                                     {"target":self.name})
+
+        #Reading the log and raw files happens off the event loop
+        loop = asyncio.get_running_loop()
+        log_lines, errors = await loop.run_in_executor(None,read_log_file,log_filename)
+        if errors != []:
+            raise SimulationException(self.name,log_filename,errors,log_values=parse_log_lines(log_lines))
+        if read_raw == False:
+            return(parse_log_lines(log_lines))
+        raw_values = await loop.run_in_executor(None,raw_values_class,self.linux_filename,log_filename,log_lines,
+                                                self.simulation_command,self.selected_nodes)
+        self.remember_raw_values(raw_values)
+        return(raw_values)
 #----------------------------------------END Netlist Class----------------------------------------#}}}
 
+#----------------------------------------Netlist Template Class----------------------------------------#{{{1
+class netlist_template_class:
+    """A netlist compiled once into fixed text pieces and parameter slots. Rendering fills the slots with new values,
+        so making a variant of the netlist doesn't deepcopy it or run any regexes. Only lines holding parameters are
+        rebuilt, every other line is shared with the original netlist"""
+    def __init__(self,netlist):
+        self.netlist = netlist
+        self.lines = list(netlist.lines)
+        self.dirty_lines = None
+        if netlist.dirty_lines != None:
+            self.dirty_lines = set(netlist.dirty_lines)
+        self.defaults = {}
+        
+        #group the parameters by line, then split each of those lines into pieces around the values
+        line_variables = {}
+        for variable, parameter_statement in netlist.parameters.items():
+            self.defaults[variable] = parameter_statement.value
+            line_variables.setdefault(parameter_statement.line_number,[]).append(variable)
+        self.line_slots = {}
+        for line_number, variables in line_variables.items():
+            line = self.lines[line_number]
+            spans = []
+            for variable in variables:
+                span = netlist.parameters[variable].span
+                if span == None:
+                    value_regex = re.compile(r"(?<![\w.]){} *= *(\S+)".format(re.escape(variable)),re.IGNORECASE)
+                    value_find = value_regex.search(line)
+                    if value_find != None:
+                        span = value_find.span(1)
+                if span != None:
+                    spans.append((span[0],span[1],variable))
+            spans.sort()
+            pieces = []
+            slots = []
+            text_start = 0
+            for value_start, value_end, variable in spans:
+                pieces.append(line[text_start:value_start])
+                slots.append((len(pieces),variable))
+                pieces.append(None)
+                text_start = value_end
+            pieces.append(line[text_start:])
+            self.line_slots[line_number] = (pieces,slots)
+
+    def __repr__(self):
+        return("template of {} ({} parameters)".format(self.netlist.name,len(self.defaults)))
+    def __str__(self):
+        return(self.__repr__())
+
+    def render_lines(self,variable_value_dictionary):
+        """Returns the netlist lines with the given variables set to the given values, every other variable
+            keeps its original value. Raises a ParameterException for a variable that's not in the netlist"""
+        for variable in variable_value_dictionary:
+            if variable not in self.defaults:
+                raise ParameterException(variable)
+        lines = list(self.lines)
+        for line_number, (pieces, slots) in self.line_slots.items():
+            pieces = list(pieces)
+            for piece_number, variable in slots:
+                pieces[piece_number] = str(variable_value_dictionary.get(variable,self.defaults[variable]))
+            lines[line_number] = "".join(pieces)
+        return(lines)
+
+    def render(self,variable_value_dictionary):
+        """Returns the text of the netlist with the given variables set to the given values"""
+        return("\n".join(self.render_lines(variable_value_dictionary))+"\n")
+
+    @instrumentation.timed("make_netlist")
+    def make_netlist(self,variable_value_dictionary,new_filename=None):
+        """Returns a new netlist_class with the given variables set to the given values, like change_parameters but
+            without deep copying the original. The new netlist shares everything but its lines, filenames and
+            changed parameters with the original"""
+        new_netlist = copy.copy(self.netlist)
+        new_netlist.set_filename(new_filename)
+        new_netlist.lines = self.render_lines(variable_value_dictionary)
+        if self.dirty_lines != None:
+            new_netlist.dirty_lines = set(self.dirty_lines)
+        new_netlist.parameters = dict(self.netlist.parameters)
+        for variable, value in variable_value_dictionary.items():
+            line_number = self.netlist.parameters[variable].line_number
+            if new_netlist.dirty_lines != None:
+                new_netlist.dirty_lines.add(line_number)
+            new_netlist.parameters[variable] = parameter_statement_class(variable,value,line_number)
+            #the other values on a changed line may have moved so drop their spans
+            for other_variable in self.netlist.line_parameters.get(line_number,[]):
+                if other_variable not in variable_value_dictionary and other_variable in new_netlist.parameters:
+                    other_statement = new_netlist.parameters[other_variable]
+                    new_netlist.parameters[other_variable] = parameter_statement_class(
+                        other_variable,other_statement.value,other_statement.line_number)
+        return(new_netlist)
+#----------------------------------------END Netlist Template Class----------------------------------------#}}}
+
 #----------------------------------------Node Value Class----------------------------------------#{{{1
 class node_value_class:
-    """Container class for node-value pairs. Values are stored as the list of values in proper order"""
-    def __init__(self,node,node_number,node_type,values=[]):
+    """Container class for node-value pairs. Values are stored as a numpy array of the values in proper order,
+        either a view into the traces of a raw_values_class or a copy of what's given"""
+    __slots__ = ("node","node_number","node_type","unit","values")
+    def __init__(self,node,node_number,node_type,values=None):
         self.node = node
-        self.values = values
+        if values is None:
+            values = numpy.zeros(0)
+        self.values = numpy.asarray(values)
         self.node_number = node_number
         self.node_type = node_type
         self.find_unit()
     
     def __repr__(self):
-        if self.values != []:
+        if len(self.values) != 0:
             if len(self.values) == 1:
                 return_string = "{} = {} {}".format(self.node,self.values[0],self.unit)
             else:
@@ -332,14 +1168,7 @@ class node_value_class:
         return(return_string)
 
     def __str__(self):
-        if self.values != []:
-            if len(self.values) == 1:
-                return_string = "{} = {} {}".format(self.node,self.values[0],self.unit)
-            else:
-                return_string = "{} = [{},...] {}".format(self.node,self.values[0],self.unit)
-        else:
-            return_string = "{} = None {}".format(self.node,self.unit)
-        return(return_string)
+        return(self.__repr__())
 
     def find_unit(self):
         """pulls the unit, ie V, A, s, Ohm, out of the node type"""
@@ -349,8 +1178,48 @@ class node_value_class:
             self.unit = "A"
         elif "time" in self.node_type:
             self.unit = "s"
+        elif "frequency" in self.node_type:
+            self.unit = "Hz"
+        else:
+            self.unit = ""
 #----------------------------------------END Variable Value Class----------------------------------------#}}}
 
+#----------------------------------------Node Value Table Class----------------------------------------#{{{1
+class node_value_table_class(collections.abc.Mapping):
+    """Read only dictionary of node names and node value classes over a list of traces, one contiguous numpy array
+        per variable. Nodes are found through a name to index table and their node value classes are only made
+        when looked up, so a run with many nodes costs one array per trace and nothing per node"""
+    __slots__ = ("variables","traces","node_index")
+    def __init__(self,variables,traces,node_index=None):
+        self.variables = variables
+        self.traces = traces
+        if node_index == None:
+            node_index = dict([(variable.node,index) for index, variable in enumerate(variables)])
+        self.node_index = node_index
+
+    def __getitem__(self,node):
+        index = self.node_index[node]
+        variable = self.variables[index]
+        return(node_value_class(node=variable.node,node_number=variable.node_number,node_type=variable.node_type,
+                                values=self.traces[index]))
+    def __iter__(self):
+        return(iter(self.node_index))
+    def __len__(self):
+        return(len(self.node_index))
+    def __contains__(self,node):
+        return(node in self.node_index)
+
+    def __repr__(self):
+        return("{{{}}}".format(", ".join([str(self[node]) for node in self.node_index])))
+    def __str__(self):
+        return(self.__repr__())
+
+    def __getstate__(self):
+        return((self.variables,self.traces,self.node_index))
+    def __setstate__(self,state):
+        self.variables, self.traces, self.node_index = state
+#----------------------------------------END Node Value Table Class----------------------------------------#}}}
+
 #----------------------------------------Pull Node----------------------------------------#{{{1
 def pull_node(line):
     """Pulls the node, node number, and node type out of the line. Returns a node_value_class obj"""
@@ -398,52 +1267,371 @@ def pull_step_number(line):
 def find_value_in_list(the_value,the_list):
     """Finds the closest value in the given ordered (from smallest to largest) list to the given value 
         without going over that value. Returns the list value and list index of the found value"""
-    min_value = the_list[0]
-    max_value = the_list[-1]
-    if the_value > max_value:
+    if len(the_list) == 0 or the_value > the_list[-1] or the_value < the_list[0]:
         return("value not in list")
-    elif the_value == max_value:
-        return(max_value)
-    elif the_value < min_value:
-        return("value not in list")
-    elif the_value == min_value:
-        return(min_value)
+    index = int(numpy.searchsorted(the_list,the_value,side="right")) - 1
+    return(the_list[index],index)
+#----------------------------------------END Find Value in List----------------------------------------#}}}
+
+#----------------------------------------Values At----------------------------------------#{{{1
+def values_at(independent_values,node_values,query_values,interpolate=True):
+    """Returns the node values at every one of the query values of the sorted independent values, as a numpy array.
+        Linearly interpolates between points by default, otherwise takes the last point not over each query value
+        like find_value_in_list. Query values outside the independent values give nan"""
+    independent_values = numpy.asarray(independent_values)
+    node_values = numpy.asarray(node_values)
+    query_values = numpy.asarray(query_values,dtype=float)
+    if interpolate == True:
+        found_values = numpy.interp(query_values,independent_values,node_values,left=numpy.nan,right=numpy.nan)
+    else:
+        indices = numpy.searchsorted(independent_values,query_values,side="right") - 1
+        found_values = node_values[numpy.clip(indices,0,len(node_values)-1)].astype(float)
+        found_values[(indices < 0) | (query_values > independent_values[-1])] = numpy.nan
+    return(found_values)
+#----------------------------------------END Values At----------------------------------------#}}}
+
+#----------------------------------------Window Statistics----------------------------------------#{{{1
+def window_statistics(independent_values,node_values,starts,stops,statistic="mean"):
+    """Returns the given statistic ("min", "max", "mean" or "rms") of the node values inside each of the windows
+        [starts[i],stops[i]] of the sorted independent values, as a numpy array. Mean and rms are weighted by the
+        independent variable (trapezoids over the points in the window) since LTspice's time steps aren't uniform.
+        Windows holding no points give nan"""
+    independent_values = numpy.asarray(independent_values,dtype=float)
+    node_values = numpy.asarray(node_values,dtype=float)
+    starts = numpy.atleast_1d(numpy.asarray(starts,dtype=float))
+    stops = numpy.atleast_1d(numpy.asarray(stops,dtype=float))
+    first_indices = numpy.searchsorted(independent_values,starts,side="left")
+    last_indices = numpy.searchsorted(independent_values,stops,side="right") - 1
+    empty = last_indices < first_indices
+    first_indices = numpy.clip(first_indices,0,len(node_values)-1)
+    last_indices = numpy.clip(last_indices,first_indices,len(node_values)-1)
+
+    if statistic in ("min","max"):
+        reduce_function = {"min":numpy.minimum,"max":numpy.maximum}[statistic]
+        #reduceat over the interleaved (first,last+1) pairs reduces each window at the even positions. A spare value
+        #on the end keeps last+1 a valid index for windows running to the last point
+        padded_values = numpy.append(node_values,0.0)
+        window_indices = numpy.empty(2*len(starts),dtype=numpy.intp)
+        window_indices[0::2] = first_indices
+        window_indices[1::2] = last_indices + 1
+        results = reduce_function.reduceat(padded_values,window_indices)[0::2]
+    elif statistic in ("mean","rms"):
+        if statistic == "rms":
+            node_values = node_values**2
+        steps = numpy.diff(independent_values)
+        running_area = numpy.concatenate(([0.0],numpy.cumsum(steps*(node_values[1:]+node_values[:-1])/2)))
+        widths = independent_values[last_indices] - independent_values[first_indices]
+        areas = running_area[last_indices] - running_area[first_indices]
+        with numpy.errstate(invalid="ignore",divide="ignore"):
+            results = numpy.where(widths > 0,areas/widths,node_values[first_indices])
+        if statistic == "rms":
+            results = numpy.sqrt(results)
+    else:
+        raise ValueError("Invalid statistic for window_statistics: {}".format(statistic))
+    results[empty] = numpy.nan
+    return(results)
+#----------------------------------------END Window Statistics----------------------------------------#}}}
+
+#----------------------------------------Threshold Crossings----------------------------------------#{{{1
+def threshold_crossings(independent_values,node_values,threshold,direction="both"):
+    """Returns the linearly interpolated independent values (ie times) where the node values cross the threshold,
+        as a numpy array. Direction can be "rising", "falling" or "both" """
+    independent_values = numpy.asarray(independent_values,dtype=float)
+    offsets = numpy.asarray(node_values,dtype=float) - threshold
+    below = offsets < 0
+    if direction == "rising":
+        crossings = numpy.flatnonzero(below[:-1] & ~below[1:])
+    elif direction == "falling":
+        crossings = numpy.flatnonzero(~below[:-1] & below[1:])
+    elif direction == "both":
+        crossings = numpy.flatnonzero(below[:-1] != below[1:])
+    else:
+        raise ValueError("Invalid direction for threshold_crossings: {}".format(direction))
+    fractions = offsets[crossings]/(offsets[crossings] - offsets[crossings+1])
+    steps = independent_values[crossings+1] - independent_values[crossings]
+    return(independent_values[crossings] + fractions*steps)
+#----------------------------------------END Threshold Crossings----------------------------------------#}}}
+
+#----------------------------------------Raw Header Class----------------------------------------#{{{1
+class raw_header_class:
+    """Container class for the header of a .raw file. Holds the header fields (Title, Plotname, Flags, ...), the
+        variables as empty node value classes, whether the values are binary or ascii, and the byte offset
+        where the values start"""
+    def __init__(self,fields,variables,binary,data_offset,encoding):
+        self.fields = fields
+        self.variables = variables
+        self.binary = binary
+        self.data_offset = data_offset
+        self.encoding = encoding
+        self.flags = fields.get("Flags","").lower().split()
+        self.number_of_variables = int(fields.get("No. Variables",len(variables)))
+        self.number_of_points = int(fields.get("No. Points",0))
+
+    def __repr__(self):
+        return("{} ({} variables, {} points)".format(self.fields.get("Plotname",""),self.number_of_variables,
+                                                   self.number_of_points))
+    def __str__(self):
+        return(self.__repr__())
+#----------------------------------------END Raw Header Class----------------------------------------#}}}
+
+#----------------------------------------Read Raw Header----------------------------------------#{{{1
+def read_raw_header(raw_filename,chunk_size=65536):
+    """Reads the header of a binary or ascii .raw file and returns a raw_header_class obj. LTspice writes the
+        header either as plain text or as UTF-16LE so the encoding is checked from the first bytes"""
+    file = open(raw_filename,"rb")
+    header_bytes = file.read(chunk_size)
+    if header_bytes[1:2] == b"\x00":
+        encoding = "utf-16-le"
     else:
-        max_index = len(the_list) - 1
-        min_index = 0
-        found_value = False
-        counter = 0
-        while found_value == False:
-            current_index = min_index + int((max_index - min_index)/2)
-            current_value = the_list[current_index]
-            if current_value == the_value:
-                return(current_value,current_index)
-            if current_value > the_value and the_list[current_index-1] <= the_value:
-                return(the_list[current_index-1],current_index-1)
-            if current_value < the_value and the_list[current_index+1] >= the_value:
-                return(current_value,current_index)
-            elif current_value > the_value:
-                max_index = current_index
-            elif current_value < the_value:
-                min_index = current_index
-            if counter == 10:
+        encoding = "latin-1"
+    markers = [("Binary:\n".encode(encoding),True),("Values:\n".encode(encoding),False)]
+    
+    #keep reading until the start of values marker shows up
+    data_offset = None
+    while data_offset == None:
+        for marker, binary in markers:
+            marker_index = header_bytes.find(marker)
+            if marker_index != -1 and (encoding != "utf-16-le" or marker_index % 2 == 0):
+                data_offset = marker_index + len(marker)
                 break
-            else:
-                counter += 1
-#----------------------------------------END Find Value in List----------------------------------------#}}}
+        if data_offset == None:
+            more_bytes = file.read(chunk_size)
+            if more_bytes == b"":
+                file.close()
+                raise RawFileException(raw_filename,"no Values: or Binary: section")
+            header_bytes += more_bytes
+    file.close()
+    
+    #split the header into the fields and variables
+    header_lines = header_bytes[:data_offset].decode(encoding).replace("\r","").split("\n")
+    fields = {}
+    variables = []
+    start_nodes = False
+    for line in header_lines:
+        if line.strip() == "" or line.startswith("Binary:") or line.startswith("Values:"):
+            continue
+        elif line.startswith("Variables:"):
+            start_nodes = True
+        elif start_nodes == True:
+            variables.append(pull_node(line))
+        elif ":" in line:
+            field, value = line.split(":",1)
+            fields[field.strip()] = value.strip()
+    return(raw_header_class(fields,variables,binary,data_offset,encoding))
+#----------------------------------------END Read Raw Header----------------------------------------#}}}
+
+#----------------------------------------Raw Binary Dtypes----------------------------------------#{{{1
+def raw_binary_dtypes(header):
+    """Returns the list of numpy dtypes, one per variable, used to store the values of a binary .raw file.
+        Complex runs (.ac) store everything as double complex and "double" runs store everything as double.
+        Otherwise the independent variable (time, dc sweep source) is a double and every other trace is a float"""
+    if "complex" in header.flags:
+        return([numpy.dtype("<c16")]*len(header.variables))
+    elif "double" in header.flags:
+        return([numpy.dtype("<f8")]*len(header.variables))
+    else:
+        dtypes = [numpy.dtype("<f4")]*len(header.variables)
+        if "operating point" not in header.fields.get("Plotname","").lower() and len(dtypes) > 1:
+            dtypes[0] = numpy.dtype("<f8")
+        return(dtypes)
+#----------------------------------------END Raw Binary Dtypes----------------------------------------#}}}
+
+#----------------------------------------Map Binary Values----------------------------------------#{{{1
+def map_binary_values(raw_filename,header,variable_indices=None):
+    """Memory maps the values section of a binary .raw file. Returns the memory map and a list of numpy arrays,
+        one per variable (or per index in variable_indices), that are zero-copy views into the map. Handles both
+        the normal point by point layout, where each view strides over the points so the other variables' columns
+        are never touched, and the "fastaccess" layout where each trace is stored in one block"""
+    dtypes = raw_binary_dtypes(header)
+    if variable_indices == None:
+        variable_indices = range(len(dtypes))
+    point_size = sum([dtype.itemsize for dtype in dtypes])
+    file_size = os.path.getsize(raw_filename)
+    available_points = (file_size - header.data_offset)//point_size
+    number_of_points = min(header.number_of_points,available_points)
+    if number_of_points <= 0:
+        return(None,[numpy.zeros(0,dtype=dtypes[index]) for index in variable_indices])
+
+    file = open(raw_filename,"rb")
+    raw_map = mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ)
+    file.close()
+    
+    traces = []
+    if "fastaccess" in header.flags:
+        offsets = numpy.cumsum([header.data_offset]+[dtype.itemsize*number_of_points for dtype in dtypes])
+        for index in variable_indices:
+            traces.append(numpy.frombuffer(raw_map,dtype=dtypes[index],count=number_of_points,
+                                           offset=int(offsets[index])))
+    else:
+        fields = ["f{}".format(index) for index in range(len(dtypes))]
+        point_dtype = numpy.dtype({"names":fields,"formats":dtypes})
+        points = numpy.frombuffer(raw_map,dtype=point_dtype,count=number_of_points,offset=header.data_offset)
+        for index in variable_indices:
+            traces.append(points[fields[index]])
+    
+    #LTspice flags compressed transient points by negating the time so take the absolute value
+    if len(traces) > 0 and 0 in variable_indices and header.variables[0].node_type == "time":
+        traces[list(variable_indices).index(0)] = numpy.abs(traces[list(variable_indices).index(0)])
+    return(raw_map,traces)
+#----------------------------------------END Map Binary Values----------------------------------------#}}}
+
+#----------------------------------------Select Variables----------------------------------------#{{{1
+def node_name(name):
+    """Returns the node name LTspice uses in the .raw header for a node or trace name, ie "out" for V(out) or out
+        and "R1" for I(R1)"""
+    if "(" in name:
+        return(name.split("(",1)[1].split(")")[0])
+    return(name)
+
+def select_variables(header,nodes=None):
+    """Returns the sorted indices of the header's variables whose node names match the nodes, a list of names
+        (ie "out", "V(out)", "I(R1)") and/or shell style patterns (ie "out*"), or a single name or pattern.
+        Matching ignores case. The first variable (the independent variable) is always kept. None keeps everything"""
+    if nodes == None:
+        return(list(range(len(header.variables))))
+    if isinstance(nodes,str):
+        nodes = [nodes]
+    patterns = [node_name(node).lower() for node in nodes]
+    variable_indices = [0]
+    for index, variable in enumerate(header.variables[1:],1):
+        name = variable.node.lower()
+        if any([name == pattern or fnmatch.fnmatchcase(name,pattern) for pattern in patterns]):
+            variable_indices.append(index)
+    return(variable_indices)
+#----------------------------------------END Select Variables----------------------------------------#}}}
+
+#----------------------------------------Iterate Ascii Points----------------------------------------#{{{1
+def iterate_ascii_points(raw_filename,header,variable_indices=None):
+    """Generator that reads the values of an ascii .raw file one line at a time and yields each point as a list of
+        floats, one per variable (or per index in the sorted variable_indices). Lines of other variables are
+        skipped without being parsed. Only the current point is held in memory"""
+    number_of_variables = len(header.variables)
+    if variable_indices == None:
+        selected = [True]*number_of_variables
+    else:
+        selected_indices = set(variable_indices)
+        selected = [index in selected_indices for index in range(number_of_variables)]
+    file = open(raw_filename,"r",encoding=header.encoding)
+    for line in file:
+        if line.startswith("Values:"):
+            break
+    point = []
+    position = 0
+    for line in file:
+        if line.strip() == "":
+            continue
+        if selected[position]:
+            point.append(pull_value(line))
+        position += 1
+        if position == number_of_variables:
+            yield(point)
+            point = []
+            position = 0
+    file.close()
+#----------------------------------------END Iterate Ascii Points----------------------------------------#}}}
+
+#----------------------------------------Find Step Starts----------------------------------------#{{{1
+def is_operating_point(header):
+    """Checks the header for an operating point run, where there is no independent variable"""
+    return("operating point" in header.fields.get("Plotname","").lower())
+
+def find_step_starts(header,independent_values):
+    """Returns the list of point indices where each step of a .raw file starts. Runs that aren't stepped are one
+        step. Each point of a stepped operating point is its own step, otherwise a step starts wherever the
+        independent variable returns to its first value"""
+    number_of_points = len(independent_values)
+    if "stepped" not in header.flags or number_of_points == 0:
+        return([0])
+    if is_operating_point(header):
+        return(list(range(number_of_points)))
+    step_starts = []
+    restarts = numpy.flatnonzero(numpy.asarray(independent_values) == independent_values[0])
+    for point_number in restarts:
+        if step_starts == [] or point_number > step_starts[-1]+1:
+            step_starts.append(int(point_number))
+    return(step_starts)
+#----------------------------------------END Find Step Starts----------------------------------------#}}}
+
+#----------------------------------------Iterate Raw Steps----------------------------------------#{{{1
+def make_step_node_values(header,step_values,variables=None):
+    """Makes the node value table (a dictionary of node names and node value classes) for one step, step_values
+        being one sequence of values per variable (of the header, or of the given variables)"""
+    if variables == None:
+        variables = header.variables
+    return(node_value_table_class(variables,[numpy.asarray(values) for values in step_values]))
+
+def iterate_raw_steps(raw_filename,nodes=None):
+    """Generator that yields (step_number,node value dictionary) for each step of a .raw file without reading
+        the whole file in. Binary files yield numpy views into the memory mapped file, ascii files are read
+        point by point and only the current step is held in memory. Give nodes to only read some of the nodes,
+        see select_variables"""
+    header = read_raw_header(raw_filename)
+    variable_indices = select_variables(header,nodes)
+    variables = [header.variables[index] for index in variable_indices]
+    if header.binary == True:
+        raw_map, traces = map_binary_values(raw_filename,header,variable_indices)
+        if len(traces) == 0:
+            return
+        step_starts = find_step_starts(header,traces[0]) + [len(traces[0])]
+        for step_number in range(len(step_starts)-1):
+            step_values = [trace[step_starts[step_number]:step_starts[step_number+1]] for trace in traces]
+            yield((step_number,make_step_node_values(header,step_values,variables)))
+        return
+
+    stepped = "stepped" in header.flags
+    operating_point = is_operating_point(header)
+    step_number = 0
+    step_points = []
+    first_value = None
+    for point in iterate_ascii_points(raw_filename,header,variable_indices):
+        if first_value == None:
+            first_value = point[0]
+        elif stepped and (operating_point or (point[0] == first_value and step_points[-1][0] != first_value)):
+            step_values = list(numpy.array(step_points,dtype=float).T.copy())
+            yield((step_number,make_step_node_values(header,step_values,variables)))
+            step_number += 1
+            step_points = []
+        step_points.append(point)
+    if step_points != []:
+        step_values = list(numpy.array(step_points,dtype=float).T.copy())
+        yield((step_number,make_step_node_values(header,step_values,variables)))
+#----------------------------------------END Iterate Raw Steps----------------------------------------#}}}
+
+#----------------------------------------Raw File Exception Class----------------------------------------#{{{1
+class RawFileException(Exception):
+    """An exception class for when a .raw file can't be interpreted"""
+    def __init__(self,raw_filename,reason):
+        self.raw_filename = raw_filename
+        self.reason = reason
+    def __repr__(self):
+        error_string = "RawFileError: Can't read {}: {}".format(self.raw_filename,self.reason)
+        return(error_string)
+    def __str__(self):
+        error_string = "RawFileError: Can't read {}: {}".format(self.raw_filename,self.reason)
+        return(error_string)
+#----------------------------------------END Raw File Exception Class----------------------------------------#}}}
 
 #----------------------------------------Raw Values Class----------------------------------------#{{{1
 class raw_values_class:
-    """Class for a raw file output. Contains a dictionary with all the node names and their values.
-        Has methods for reading in a .raw file. Can convert a given .net filename into corresponding .raw"""
+    """Class for a raw file output. Holds the traces of the .raw file as a list of numpy arrays, one per variable, a
+        name to index table for the nodes, and node_values, a dictionary like node value table of node names and
+        node value classes over those traces. Has methods for reading in a .raw file.
+        Give nodes (names and/or patterns, see select_variables) to only read those nodes and the independent
+        variable; the variables read are kept in variables.
+        Can convert a given .net filename into corresponding .raw"""
+    __slots__ = ("raw_filename","log_filename","log_lines","log_values","name","simulation_command","header",
+                 "nodes","variables","raw_map","traces","node_index","node_values","step_starts","independent_node")
    
-    def __init__(self,filename,log_filename,log_lines,simulation_command):
+    def __init__(self,filename,log_filename,log_lines,simulation_command,nodes=None):
         self.raw_filename = filename.replace(".net",".raw")#convert .net to .raw
         self.log_filename = log_filename
         self.log_lines = log_lines
+        self.log_values = parse_log_lines(log_lines)
         self.name = remove_path_from_name(self.raw_filename)
         self.simulation_command = simulation_command
+        self.nodes = nodes
         self.node_values = "undefined" 
+        self.raw_map = None
         self.read_in_file()
 
     def __repr__(self):
@@ -451,53 +1639,80 @@ class raw_values_class:
     def __str__(self):
         return(self.name)
 
+    def __getstate__(self):
+        """Drops the memory map when pickling (e.g. sending results back from a sweep worker), the traces
+            are pickled as copies of the mapped values"""
+        state = dict([(slot,getattr(self,slot,None)) for slot in self.__slots__])
+        state["raw_map"] = None
+        return(state)
+    def __setstate__(self,state):
+        for slot, value in state.items():
+            setattr(self,slot,value)
+
+    @instrumentation.timed("read_raw")
     def read_in_file(self):
-        """Reads in the raw collect and collects the node and value info storing them indiciviually in a 
-            node value class. Returns a dictionary of node names and corresponding node value classes"""
-   
-        #Open file for reading
-        file = open(self.raw_filename,"r")
-        self.raw_file_lines = file.readlines()
-        file.close()
-        
-        #Read and interpret the raw file
-        start_nodes = False
-        start_values = False
-        value_count = 0
-        node_values = []
-        for line in self.raw_file_lines:
-            line=line.rstrip()
-            if "Variables:" in line:
-                if "No. Variables" not in line:
-                    start_nodes = True
-                
-            elif "Values:" in line:
-                start_nodes = False
-                start_values = True
-
-            elif start_nodes == True:
-                node_value_pair = pull_node(line)
-                node_values.append(copy.deepcopy(node_value_pair))
-           
-            elif start_values == True:
-                if pull_step_number(line) != False:
-                    step_number = pull_step_number
-                    value_count = 0
-                value = pull_value(line)
-                node_values[value_count].values.append(value)
-                value_count += 1
+        """Reads in the raw file and collects the node and value info into one numpy array per variable.
+            Binary files are memory mapped, ascii files (-ascii) are parsed line by line. Only the variables
+            selected by nodes are read"""
+        self.header = read_raw_header(self.raw_filename)
+        variable_indices = select_variables(self.header,self.nodes)
+        self.variables = [self.header.variables[index] for index in variable_indices]
+        if self.header.binary == True:
+            self.raw_map, self.traces = map_binary_values(self.raw_filename,self.header,variable_indices)
+        else:
+            self.traces = self.read_in_ascii_file(variable_indices)
+        instrumentation.count("raw_file_bytes",os.path.getsize(self.raw_filename))
+        if len(self.traces) > 0:
+            instrumentation.count("raw_points_read",len(self.traces[0]))
+        self.index_traces()
+
+    def index_traces(self):
+        """Makes the node value table, step starts and independent node over the traces (ie after they're read, or
+            after traces sent from another process are attached)"""
+        self.node_values = node_value_table_class(self.variables,self.traces)
+        self.node_index = self.node_values.node_index
+        if len(self.traces) > 0:
+            self.step_starts = find_step_starts(self.header,self.traces[0])
+        else:
+            self.step_starts = [0]
        
         #Pull the independent node
-        if self.simulation_command.command_type != "operating point":
-            self.independent_node = node_values[0]
+        if self.simulation_command.command_type != "operating point" and len(self.traces) > 0:
+            self.independent_node = self.node_values[self.variables[0].node]
         else:
             self.independent_node = "operating point"
 
-        #Make the node dictionary
-        node_dictionary = {}
-        for node_value in node_values:
-            node_dictionary[node_value.node] = node_value
-        self.node_values = node_dictionary
+    def read_in_ascii_file(self,variable_indices=None):
+        """Reads in an ascii raw file line by line into one float64 array per variable (or per index in
+            variable_indices), all rows of one contiguous block. Returns the list of arrays. The raw text isn't kept
+            once it's parsed"""
+        if variable_indices == None:
+            variable_indices = list(range(len(self.header.variables)))
+        number_of_points = max(self.header.number_of_points,1)
+        values = numpy.empty((len(variable_indices),number_of_points))
+        point_number = 0
+        for point in iterate_ascii_points(self.raw_filename,self.header,variable_indices):
+            if point_number == values.shape[1]:
+                values = numpy.concatenate((values,numpy.empty_like(values)),axis=1)
+            values[:,point_number] = point
+            point_number += 1
+        return(list(numpy.ascontiguousarray(values[:,:point_number])))
+
+    def return_step(self,step_number):
+        """Returns a node value table (a dictionary of node names and node value classes) holding only the
+            values of the given step (counting from 0) of a stepped run. The values are views, nothing is copied"""
+        step_start = self.step_starts[step_number]
+        if step_number+1 < len(self.step_starts):
+            step_stop = self.step_starts[step_number+1]
+        else:
+            step_stop = None
+        step_traces = [trace[step_start:step_stop] for trace in self.traces]
+        return(node_value_table_class(self.variables,step_traces,self.node_index))
+
+    def iterate_steps(self):
+        """Generator that yields (step_number,node value dictionary) for each step, see return_step"""
+        for step_number in range(len(self.step_starts)):
+            yield((step_number,self.return_step(step_number)))
 
     def return_node_value(self,name,name_type="node"):
         """Returns the node_value object correspoding to the name given. If name_type option is set to 
@@ -512,21 +1727,61 @@ class raw_values_class:
         node_value = self.node_values[name]
         return(node_value)
 
-    def find_node_value_at_independet_value(self,given_independent_value,given_node):
+    def step_values(self,given_node,step,function_name):
+        """Returns the (independent values, node values) a query of the given node runs on. For stepped runs those
+            of the given step (counting from 0), since the whole independent trace starts over at each step. The node
+            can be a whole trace or the node value of that step from return_step. Unstepped runs take step None"""
+        independent_values = self.independent_node.values
+        node_values = given_node.values
+        if step == None:
+            if len(self.step_starts) > 1:
+                raise ValueError("Invalid step for {}: the run has {} steps, give the step".format(
+                    function_name,len(self.step_starts)))
+            return((independent_values,node_values))
+        if step < 0 or step >= len(self.step_starts):
+            raise ValueError("Invalid step for {}: {} of {} steps".format(function_name,step,len(self.step_starts)))
+        step_start = self.step_starts[step]
+        step_stop = self.step_starts[step+1] if step+1 < len(self.step_starts) else len(independent_values)
+        if len(node_values) == len(independent_values):
+            node_values = node_values[step_start:step_stop]
+        independent_values = independent_values[step_start:step_stop]
+        if len(node_values) != len(independent_values):
+            raise ValueError("Invalid node for {}: {} values, step {} has {}".format(function_name,len(node_values),
+                                                                                    step,len(independent_values)))
+        return((independent_values,node_values))
+
+    def find_node_value_at_independet_value(self,given_independent_value,given_node,step=None):
         """Finds the value of the given node at the given corresponding independent node value.
-            Returns the (actual_independent_value,given_node_value)."""
-        return_values = find_value_in_list(given_independent_value,self.independent_node.values)
+            Returns the (actual_independent_value,given_node_value). Stepped runs need the step, see step_values"""
+        independent_values, node_values = self.step_values(given_node,step,"find_node_value_at_independet_value")
+        return_values = find_value_in_list(given_independent_value,independent_values)
+        if return_values == "value not in list":
+            return(return_values)
         actual_independent_value = return_values[0]
-        given_node_value = given_node.values[return_values[1]]
+        given_node_value = node_values[return_values[1]]
         return((actual_independent_value,given_node_value))
+
+    def find_node_values_at_independent_values(self,given_independent_values,given_node,interpolate=True,step=None):
+        """Finds the values of the given node at many independent values (ie times) at once. Returns a numpy array,
+            see values_at. Stepped runs need the step, see step_values"""
+        independent_values, node_values = self.step_values(given_node,step,"find_node_values_at_independent_values")
+        return(values_at(independent_values,node_values,given_independent_values,interpolate))
+
+    def find_node_window_statistics(self,given_node,starts,stops,statistic="mean",step=None):
+        """Returns the "min", "max", "mean" or "rms" of the given node over each window of the independent
+            values, see window_statistics. Stepped runs need the step, see step_values"""
+        independent_values, node_values = self.step_values(given_node,step,"find_node_window_statistics")
+        return(window_statistics(independent_values,node_values,starts,stops,statistic))
+
+    def find_node_threshold_crossings(self,given_node,threshold,direction="both",step=None):
+        """Returns the independent values (ie times) where the given node crosses the threshold, see
+            threshold_crossings. Stepped runs need the step, see step_values"""
+        independent_values, node_values = self.step_values(given_node,step,"find_node_threshold_crossings")
+        return(threshold_crossings(independent_values,node_values,threshold,direction))
 #----------------------------------------END Raw Values Class----------------------------------------#}}}
         
 
-##Read netlist file into the netlist object
-original_filename = "/home/kevin/.wine/drive_c/Program Files/LTC/LTspiceIV/Python_LTSpice_Examples/simple_resistance_circuit.net"
-original_netlist = netlist_class(original_filename)
-raw_values = original_netlist.run_netlist()
-for node, node_value in raw_values.node_values.iteritems():
-    test = .5 #s
-    result = raw_values.find_node_value_at_independet_value(given_independent_value=test,given_node=node_value)
-    print(node,result)
+if __name__ == "__main__":
+    #python -m python_ltspice_tools runs the command line tools, see python_ltspice_cli
+    from python_ltspice_cli import main
+    sys.exit(main())
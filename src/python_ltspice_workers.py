@@ -0,0 +1,100 @@
+#!/usr/bin/python
+# Python Code for keeping a pool of simulator workers running. The workers share one warm, persistent wineserver
+# and a simulator_class with the paths already resolved, and take netlist jobs from a queue
+import queue
+import threading
+from python_ltspice_tools import simulator_class
+from python_ltspice_lazy import lazy_import
+
+concurrent = lazy_import("concurrent.futures",globals())
+
+#----------------------------------------Simulator Pool Class----------------------------------------#{{{1
+class simulator_pool_class:
+    """A pool of long lived worker threads that run netlists through one simulator_class. Wine's server is started
+        (and kept running) once when the pool starts, so each job only pays for the LTspice run itself. Jobs are
+        queued with submit, which returns a future for the job's raw_values_class. The startup time and the time
+        spent simulating are reported separately by timing"""
+    def __init__(self,number_of_workers=4,simulator=None,raise_errors=True):
+        if simulator == None:
+            simulator = simulator_class()
+        self.simulator = simulator
+        self.number_of_workers = number_of_workers
+        self.raise_errors = raise_errors
+        self.jobs = queue.Queue()
+        self.workers = []
+        self.started = False
+
+    def __repr__(self):
+        return("simulator pool of {} workers: {}".format(self.number_of_workers,self.simulator))
+    def __str__(self):
+        return(self.__repr__())
+
+    def __enter__(self):
+        self.start()
+        return(self)
+    def __exit__(self,exception_type,exception,traceback):
+        self.close()
+
+    def start(self):
+        """Starts the wineserver and the worker threads"""
+        if self.started == True:
+            return
+        self.simulator.start()
+        for worker_number in range(self.number_of_workers):
+            worker = threading.Thread(target=self.work,name="simulator worker {}".format(worker_number))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+        self.started = True
+
+    def work(self):
+        """Worker loop: runs queued netlists until it's handed None"""
+        while True:
+            job = self.jobs.get()
+            if job == None:
+                break
+            netlist, future = job
+            if future.set_running_or_notify_cancel() == False:
+                continue
+            try:
+                raw_values = netlist.run_netlist(raise_errors=self.raise_errors,simulator=self.simulator)
+                future.set_result(raw_values)
+            except BaseException as exception:
+                future.set_exception(exception)
+
+    def submit(self,netlist):
+        """Queues the netlist to be run and returns a concurrent.futures.Future of its raw_values_class.
+            Netlists running at the same time need their own working files, see change_parameters"""
+        self.start()
+        future = concurrent.futures.Future()
+        self.jobs.put((netlist,future))
+        return(future)
+
+    def map(self,netlists):
+        """Runs all the netlists and returns their raw_values_class objects in the same order"""
+        futures = [self.submit(netlist) for netlist in netlists]
+        return([future.result() for future in futures])
+
+    def timing(self):
+        """Returns a dictionary of the wine startup time, the number of runs and the total and average
+            time spent simulating"""
+        if self.simulator.run_count > 0:
+            average_run_time = self.simulator.run_time/self.simulator.run_count
+        else:
+            average_run_time = 0.0
+        return({"startup_time":self.simulator.startup_time,"run_count":self.simulator.run_count,
+                "run_time":self.simulator.run_time,"average_run_time":average_run_time})
+
+    def close(self,stop_server=True):
+        """Waits for the queued jobs to finish, stops the workers and (by default) shuts down the wineserver"""
+        if self.started == False:
+            return
+        for worker in self.workers:
+            self.jobs.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        self.started = False
+        if stop_server == True:
+            self.simulator.stop()
+#----------------------------------------END Simulator Pool Class----------------------------------------#}}}
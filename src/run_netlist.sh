@@ -2,5 +2,5 @@
 source ~/.bashrc
 cd $C_DRIVE
 cd Program\ Files/LTC/LTspiceIV
-wine scad3.exe -ascii -b -run $1
+wine scad3.exe -b -run $1
 
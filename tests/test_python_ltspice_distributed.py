@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# Localhost tests of the distributed sweep's handling of lost and timed out workers. The run functions stand in for
+# LTspice so no simulator is needed, only the example netlist
+import os
+import re
+import sys
+import time
+import shutil
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","src"))
+from python_ltspice_tools import netlist_class
+from python_ltspice_distributed import run_distributed_sweep, WorkerLostException
+
+example_netlist = os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","examples",
+                               "simple_resistance_circuit.net")
+
+def make_netlist(directory):
+    netlist_filename = os.path.join(str(directory),"circuit.net")
+    shutil.copy(example_netlist,netlist_filename)
+    return(netlist_class(netlist_filename))
+
+def run_point(point_netlist):
+    """Sleeps for the point's Rload1 seconds and returns it, or exits the worker for a value of "die" (once)"""
+    value = re.search(r"Rload1=(\S+)","\n".join(point_netlist.lines)).group(1)
+    if value == "die" and not os.path.exists(point_netlist.linux_directory+"died"):
+        open(point_netlist.linux_directory+"died","w").close()
+        os._exit(1)
+    if value != "die":
+        time.sleep(float(value))
+    return(value)
+
+def run_sweep(netlist,values,**keywords):
+    start_time = time.time()
+    results = list(run_distributed_sweep(netlist,{"Rload1":values},run_function=run_point,**keywords))
+    return(sorted(results,key=lambda result:result.index), time.time()-start_time)
+
+def test_lost_worker(tmp_path):
+    """The point of a worker that exits is run again by another worker"""
+    results, run_time = run_sweep(make_netlist(tmp_path),["0","die","0.1","0"],local_workers=2)
+    assert [result.exception for result in results] == [None]*4
+    assert [result.raw_values for result in results] == ["0","die","0.1","0"]
+
+def test_job_timeout(tmp_path):
+    """A point that always passes job_timeout fails after max_attempts, its workers reconnect and run the other
+        points, and the sweep ends rather than waiting for workers that are gone"""
+    results, run_time = run_sweep(make_netlist(tmp_path),["0","3","0","0","0"],local_workers=2,job_timeout=1,
+                                  max_attempts=3)
+    assert len(results) == 5
+    assert isinstance(results[1].exception,WorkerLostException)
+    assert results[1].exception.attempts == 3
+    assert [result.raw_values for result in results if result.index != 1] == ["0"]*4
+    assert run_time < 30
+
+def test_no_workers(tmp_path):
+    """With no workers connected the points fail once worker_timeout has passed"""
+    results, run_time = run_sweep(make_netlist(tmp_path),["0","0"],local_workers=0,worker_timeout=1)
+    assert len(results) == 2
+    assert all(isinstance(result.exception,WorkerLostException) for result in results)
+    assert run_time < 10